@@ -1,25 +1,21 @@
 #!/usr/bin/env python3
 
 import logging
-from logging.handlers import RotatingFileHandler
 import os
+from pathlib import Path
 from pprint import pformat
+import shlex
 import subprocess
 import sys
 import time
 from random import randint, random as randfloat
 
-logging.basicConfig(stream=sys.stderr, level=logging.INFO)
-
+# This runs outside of the pipenv, so load `weather_reporter.log` (stdlib only) from the source tree
+sys.path.append(str(Path(__file__).resolve().parent.parent / "weather-reporter-package" / "src"))
+from weather_reporter.log import setup_rotating_file_log  # noqa: E402
+from weather_reporter.profiling import parse_probability, profile_from_env  # noqa: E402
 
-def parse_probability(strn: str) -> float:
-    splat = strn.split('/')
-    if len(splat) == 2:
-        numer, denom = splat
-        return float(numer) / float(denom)
-    elif len(splat) == 1:
-        return float(splat[0])
-    raise ValueError(f"Cannot parse probabilty str of '{strn}'")
+logging.basicConfig(stream=sys.stderr, level=logging.INFO)
 
 
 # Designed for a crontab like: */5 6-22 * * * * * *
@@ -30,22 +26,19 @@ EXEC_DELAY_MAX_SECS = int(os.environ.get("KITE_EXEC_DELAY_MAX_SECS", 120))
 SPOT_IDS = [int(x.strip())
             for x in os.environ.get("KITE_SPOT_IDS", "").split(",") if x]
 LOG_FILE_PATH = os.environ.get("KITE_LOG_FILE_PATH")
+PAGE_CACHE_DIR = os.environ.get("KITE_PAGE_CACHE_DIR")
+# The project's virtualenv (as made with `PIPENV_VENV_IN_PROJECT=1 pipenv install`). Its scripts
+# are run directly: `pipenv run` costs ~400ms of startup per script, several times what
+# the scripts themselves take to start
+VENV_BIN_DIR = os.environ.get(
+    "KITE_VENV_BIN_DIR", str(Path(__file__).resolve().parent.parent / ".venv" / "bin"))
 
 
-def setup_rotating_file_log(log_filepath: str):
-    try:
-        os.mkdir(os.path.dirname(log_filepath))
-    except FileExistsError:
-        pass
-    log_handler = RotatingFileHandler(log_filepath)
-    formatter = logging.Formatter(
-        '%(asctime)s kiteink [%(process)d]: %(message)s',
-        '%b %d %H:%M:%S')
-    # formatter.converter = time.gmtime  # if you want UTC time
-    log_handler.setFormatter(formatter)
-    logger = logging.getLogger()
-    logger.addHandler(log_handler)
-    logger.setLevel(logging.INFO)
+def get_script_command(script: str) -> str:
+    path = os.path.join(VENV_BIN_DIR, script)
+    if os.access(path, os.X_OK):
+        return shlex.quote(path)
+    return f"pipenv run {script}"
 
 
 def main():
@@ -74,13 +67,18 @@ def main():
         time.sleep(sleep_secs)
         logging.info("Beginning fetch + paint")
         spot_ids = ' '.join([str(x) for x in SPOT_IDS])
-        subprocess.call(
-            f'pipenv run fetch_spots_json.py --threaded {spot_ids} | pipenv run paint_report_from_json.py --epaper', shell=True
-        )
+        fetch = get_script_command("fetch_spots_json.py")
+        paint = get_script_command("paint_report_from_json.py")
+        fetch_and_paint = f'{fetch} --threaded {spot_ids} | {paint} --epaper'
+        if PAGE_CACHE_DIR:
+            # Rotate to the next cached page of spots, only fetching once every page has been shown
+            fetch_and_paint = f'{paint} --from-cache --epaper || ({fetch_and_paint})'
+        subprocess.call(fetch_and_paint, shell=True)
     else:
         logging.info(
             f"Randomly skipping fetch + paint--{1-EXEC_PROBABILITY} probabilty to skip")
 
 
 if __name__ == '__main__':
-    main()
+    with profile_from_env("scrape_limiter_entrypoint"):
+        main()
@@ -19,6 +19,12 @@ setuptools.setup(
     python_requires=">=3.6",
     scripts=[
         "src/bin/fetch_spots_json.py",
-        "src/bin/paint_report_from_json.py"
+        "src/bin/paint_report_from_json.py",
+        "src/bin/run_display_pipeline.py",
+        "src/bin/next_kite_session.py",
+        "src/bin/backfill_timelapse.py",
+        "src/bin/run_wf_simulator.py",
+        "src/bin/load_test_fetch.py",
+        "src/bin/query_column_archive.py"
     ]
 )
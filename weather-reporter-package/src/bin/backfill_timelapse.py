@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+import sys
+from functools import partial
+
+from weather_reporter.backfill import (GifStreamWriter, encode_gif_frame,
+                                       log_progress, plan_frames,
+                                       render_frames, save_png_frame)
+from weather_reporter.bundle_archive import ARCHIVE_DIR, list_bundles
+from weather_reporter.painter import parse_local_datetime
+from weather_reporter.pipeline import parse_hours
+
+logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+
+def main():
+    '''
+    Render what the display showed over a date range, from bundles archived by
+    `fetch_spots_json.py --archive-dir`, as an animated GIF or a directory of PNGs
+    '''
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR,
+                        help="Archived spots data (KITE_ARCHIVE_DIR)")
+    parser.add_argument('--start', type=parse_local_datetime, required=True,
+                        help="e.g., 2022-02-01 or 2022-02-01T06:00")
+    parser.add_argument('--end', type=parse_local_datetime, required=True)
+    parser.add_argument('--cycle-secs', type=int, default=20 * 60)
+    parser.add_argument('--hours', type=parse_hours, default=(6, 23),
+                        help="Inclusive local hours the display refreshes in, e.g., 6-22")
+    parser.add_argument('--max-bundle-age-secs', type=int, default=6 * 60 * 60,
+                        help="Skip cycles without data fetched this recently")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="Render frames across this many processes (default: a process per CPU)")
+
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--gif', type=argparse.FileType('wb'),
+                       help="Write an animated GIF")
+    group.add_argument('--outdir', help="Write a PNG per frame into this directory")
+    parser.add_argument('--frame-ms', type=int, default=100,
+                        help="How long each frame of the GIF is shown")
+
+    args = parser.parse_args()
+
+    if not args.archive_dir:
+        parser.error("--archive-dir or KITE_ARCHIVE_DIR is required")
+
+    bundles = list_bundles(args.archive_dir)
+    logging.info(f"Found {len(bundles)} archived bundles")
+
+    frames = plan_frames(
+        bundles, args.start.timestamp(), args.end.timestamp(), args.cycle_secs,
+        active_hours=args.hours, max_bundle_age_secs=args.max_bundle_age_secs)
+
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+        for _ in log_progress(render_frames(frames, partial(save_png_frame, outdir=args.outdir), args.processes)):
+            pass
+    else:
+        writer = GifStreamWriter(args.gif)
+        try:
+            for blocks in log_progress(render_frames(frames, partial(encode_gif_frame, duration_ms=args.frame_ms), args.processes)):
+                writer.write_frame(blocks)
+        finally:
+            writer.close()
+
+
+if __name__ == '__main__':
+    main()
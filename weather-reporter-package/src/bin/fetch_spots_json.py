@@ -1,21 +1,20 @@
 #!/usr/bin/env python3
 import argparse
-import concurrent.futures
 import json
 import logging
 import os
-import re
 import sys
-from base64 import b64encode
 
+from weather_reporter.bundle_archive import ARCHIVE_DIR, archive_bundle
+from weather_reporter.column_archive import COLUMN_ARCHIVE_DIR, ColumnArchive
+from weather_reporter.fetcher import (WF_MODEL_NAME, fetch_spots_data,
+                                      get_model_id, make_wfapi_from_env)
 from weather_reporter.log import setup_rotating_file_log
-from weather_reporter.weatherflow_api import (WeatherFlowModel,
-                                              WeatherflowApiWithWfTokenCache)
+from weather_reporter.profiling import profile_from_env
 
 logging.basicConfig(stream=sys.stderr, level=logging.INFO)
 
 LOG_FILE_PATH = os.environ.get("KITE_LOG_FILE_PATH")
-WF_MODEL_NAME = re.sub(r'\W', '_', os.environ.get("WF_MODEL_NAME", "Quicklook").lower())
 
 
 def main():
@@ -26,6 +25,10 @@ def main():
                         type=argparse.FileType('w'), default=sys.stdout)
     parser.add_argument('spotids', action='store', type=int, nargs='+')
     parser.add_argument('--threaded', action='store_true', default=False)
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR,
+                        help="Also save the fetched data here, e.g., to backfill time-lapses later")
+    parser.add_argument('--column-archive-dir', default=COLUMN_ARCHIVE_DIR,
+                        help="Also append observations and forecasts to a columnar archive here, for querying later")
 
     args = parser.parse_args()
 
@@ -33,48 +36,31 @@ def main():
         setup_rotating_file_log(LOG_FILE_PATH)
 
     try:
-        model_id: WeatherFlowModel = getattr(WeatherFlowModel, WF_MODEL_NAME)
+        model_id = get_model_id(WF_MODEL_NAME)
     except AttributeError:
         logging.error(f"Unknown model name: {WF_MODEL_NAME}")
         sys.exit(1)
 
-    username = os.environ.get("WF_USERNAME", None)
-    pw = os.environ.get("WF_PASSWORD", None)
-    wfapi = WeatherflowApiWithWfTokenCache(
-        username=username, password=pw, expect_upgraded=bool(username and pw))
-
-    def fetch_spot_data(spot_id: str):
-        logging.info(f"Fetching spot {spot_id} (with model {model_id})")
-        graph_summary_data = wfapi.fetch_graph_summary(spot_id)
-        model_data = wfapi.fetch_model(spot_id, model_id)
-
-        gauge_img = wfapi.fetch_gauge_img(
-            # Decide if this is reasonable
-            int(graph_summary_data["last_ob_avg"] or 0),
-            graph_summary_data["last_ob_dir"],
-            graph_summary_data["last_ob_dir_txt"]
-        )
-
-        return (
-            {
-                "graph_summary": graph_summary_data,
-                "models": {
-                    model_id.value: model_data
-                },
-                "gauge_img": b64encode(gauge_img.read()).decode('utf8')
-            }
-        )
-
-    if args.threaded:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as exe:
-            spots_data = list(exe.map(fetch_spot_data, args.spotids))
-    else:
-        spots_data = []
-        for spot_id in args.spotids:
-            spots_data.append(fetch_spot_data(spot_id))
+    wfapi = make_wfapi_from_env()
+
+    spots_data = fetch_spots_data(
+        wfapi, args.spotids, model_id, threaded=args.threaded)
+
+    if args.archive_dir:
+        try:
+            archive_bundle(args.archive_dir, spots_data)
+        except OSError as err:
+            logging.warning(f"Failed to archive fetched data: {err}")
+
+    if args.column_archive_dir:
+        try:
+            ColumnArchive(args.column_archive_dir).append_cycle(spots_data)
+        except (OSError, ValueError) as err:
+            logging.warning(f"Failed to append fetched data to the column archive: {err}")
 
     json.dump(spots_data, args.outfile, indent=2, sort_keys=True)
 
 
 if __name__ == '__main__':
-    main()
+    with profile_from_env("fetch_spots_json"):
+        main()
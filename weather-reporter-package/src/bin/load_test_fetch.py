@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import logging
+import sys
+
+from weather_reporter.fetch_load import run_fetch_load
+from weather_reporter.fetcher import WF_MODEL_NAME, get_model_id
+from weather_reporter.wf_simulator import (WeatherflowSimulator,
+                                          add_simulator_args,
+                                          get_simulator_config)
+
+logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+
+
+def main():
+    '''
+    Fetch N spots from M simulated devices at once, against a local Weatherflow
+    simulator (or `--url` of one already running), and report throughput and latencies
+    '''
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--spots', type=int, default=3, help="Fetch spots 1 to N")
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--cycles', type=int, default=5, help="Fetches per device")
+    parser.add_argument('--threaded', action='store_true', default=False)
+    parser.add_argument('--anonymous', action='store_true', default=False,
+                        help="Fetch without logging in")
+    parser.add_argument('--url', default=None,
+                        help="Use the simulator (`run_wf_simulator.py`) running here, rather than starting one")
+    add_simulator_args(parser)
+
+    args = parser.parse_args()
+
+    try:
+        model_id = get_model_id(WF_MODEL_NAME)
+    except AttributeError:
+        logging.error(f"Unknown model name: {WF_MODEL_NAME}")
+        sys.exit(1)
+
+    with contextlib.ExitStack() as stack:
+        url = args.url
+        sim = None
+        if not url:
+            sim = stack.enter_context(WeatherflowSimulator(get_simulator_config(args)))
+            url = sim.url
+
+        credentials = {} if args.anonymous else {"username": "loadtest", "password": "loadtest"}
+        report = run_fetch_load(
+            list(range(1, args.spots + 1)), args.devices, args.cycles, model_id,
+            threaded=args.threaded, api_url=url, login_url=url, anonymous_url=url, **credentials)
+
+    print(report.format())
+    if sim:
+        print(f"simulator: {dict(sorted(sim.stats.items()))}")
+
+
+if __name__ == '__main__':
+    main()
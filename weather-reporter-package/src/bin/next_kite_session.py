@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime
+
+from weather_reporter.painter import TZ, parse_iso_datetime
+from weather_reporter.window_index import (WINDOW_INDEX_PATH, KiteWindow,
+                                           WindowIndex)
+
+logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+
+def format_window(window: KiteWindow) -> str:
+    start = datetime.fromtimestamp(window.start, tz=TZ)
+    end = datetime.fromtimestamp(window.end, tz=TZ)
+    peak_at = datetime.fromtimestamp(window.peak_at, tz=TZ)
+    end_format = "%H:%M %Z" if end.date() == start.date() else "%a %H:%M %Z"
+    return (
+        f"{window.spot_name} ({window.spot_id}, model {window.model}): "
+        f"{start:%a %b %d %H:%M}-{end.strftime(end_format)}, "
+        f"peak {window.peak} {window.units_wind} at {peak_at:%a %H:%M}"
+    )
+
+
+def main():
+    '''
+    Answer "when is the next session?" from the kiteable window index, which
+    `paint_report_from_json.py` and `run_display_pipeline.py` update on every fetch
+    '''
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--window-index', default=WINDOW_INDEX_PATH,
+                        help="Path of the kiteable window index (KITE_WINDOW_INDEX_PATH)")
+    parser.add_argument('--spot-id', type=int, default=None,
+                        help="Only consider this spot, rather than any spot")
+    parser.add_argument('--all', action='store_true', default=False,
+                        help="List every upcoming window, rather than just the next")
+    parser.add_argument('--now', type=parse_iso_datetime, default=None,
+                        help="Answer as of this ISO datetime (with offset), rather than now")
+
+    args = parser.parse_args()
+
+    if not args.window_index:
+        parser.error("--window-index or KITE_WINDOW_INDEX_PATH is required")
+
+    index = WindowIndex(args.window_index)
+    now = args.now.timestamp() if args.now else time.time()
+
+    if args.all:
+        windows = index.windows(spot_id=args.spot_id, after=now)
+    else:
+        window = index.next_window(now, spot_id=args.spot_id)
+        windows = [window] if window else []
+
+    if not windows:
+        logging.info("No kiteable windows forecast")
+        sys.exit(1)
+
+    for window in windows:
+        print(format_window(window))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,8 +7,12 @@ import os
 import sys
 
 from weather_reporter.log import setup_rotating_file_log
+from weather_reporter.profiling import profile_from_env
+from weather_reporter.page_cache import PageCache, update_page_cache
 from weather_reporter.painter import (composite_red_blk_imgs,
-                                      paint_blk_and_red_imgs)
+                                      normalize_spot_data,
+                                      paint_blk_and_red_imgs, paginate_spots)
+from weather_reporter.window_index import WINDOW_INDEX_PATH, WindowIndex
 
 logging.basicConfig(stream=sys.stderr, level=logging.INFO)
 
@@ -16,31 +20,35 @@ logging.basicConfig(stream=sys.stderr, level=logging.INFO)
 LOG_FILE_PATH = os.environ.get("KITE_LOG_FILE_PATH")
 
 
-try:
-    from weather_reporter.epaper_display import epd_display_images
-except (ImportError, OSError) as err:
-    logging.warning(f"Failed to import epaper display module: {err}")
-    epd_display_images = None
+VER = 1
 
+PAGE_CACHE_DIR = os.environ.get("KITE_PAGE_CACHE_DIR")
 
-VER = 1
+EXIT_CACHE_NEEDS_REFRESH = 3
+
+
+def read_spots_data(infile) -> list:
+    spots_data = json.load(infile)
 
+    if not isinstance(spots_data, collections.abc.Sequence):
+        spots_data = [spots_data]
 
-def normalize_graph_summary_data(graph_summary_data: dict):
-    return {
-        **graph_summary_data,
-        "last_ob_avg": graph_summary_data.get("last_ob_avg", 0)
-    }
+    return [
+        normalize_spot_data(d) for d in spots_data
+    ]
 
 
-def normalize_spot_data(spot_data: dict) -> dict:
-    return {
-        **spot_data,
-        "graph_summary": {
-            **spot_data["graph_summary"],
-            "last_ob_avg": spot_data["graph_summary"]["last_ob_avg"] or 0
-        }
-    }
+def import_epd_display_images():
+    '''
+    The waveshare driver is slow to import and probes GPIO/SPI hardware on import,
+    so only load it when we are actually painting to the epaper display
+    '''
+    try:
+        from weather_reporter.epaper_display import epd_display_images
+    except (ImportError, OSError) as err:
+        logging.warning(f"Failed to import epaper display module: {err}")
+        return None
+    return epd_display_images
 
 
 def main():
@@ -57,23 +65,57 @@ def main():
         '--epaper', action='store_true', default=False)
     group.add_argument(
         '--show', action='store_true', default=False)
+
+    parser.add_argument('--page-cache-dir', default=PAGE_CACHE_DIR,
+                        help="Paint every page of spots into this cache and show the next page in rotation")
+    parser.add_argument('--from-cache', action='store_true', default=False,
+                        help=f"Show the next cached page without reading --infile. Exits {EXIT_CACHE_NEEDS_REFRESH} if a fetch is due")
+    parser.add_argument('--window-index', default=WINDOW_INDEX_PATH,
+                        help="Update this kiteable window index with the fetched data, and highlight each spot's next window")
     args = parser.parse_args()
 
     if LOG_FILE_PATH:
         setup_rotating_file_log(LOG_FILE_PATH)
 
-    spots_data = json.load(args.infile)
-
-    if not isinstance(spots_data, collections.abc.Sequence):
-        spots_data = [spots_data]
-
-    normalized_spots_data = [
-        normalize_spot_data(d) for d in spots_data
-    ]
-
-    blk_img, red_img = paint_blk_and_red_imgs(normalized_spots_data)
+    if args.from_cache and not args.page_cache_dir:
+        parser.error("--from-cache requires --page-cache-dir")
+
+    windows = WindowIndex(args.window_index) if args.window_index else None
+
+    def read_and_index_spots_data():
+        spots_data = read_spots_data(args.infile)
+        if windows:
+            # The index is optional--never let it stop the display from updating
+            try:
+                windows.update(spots_data)
+                windows.save()
+            except Exception as err:
+                logging.warning(f"Failed to update the window index: {err!r}")
+        return spots_data
+
+    if args.page_cache_dir:
+        page_cache = PageCache(args.page_cache_dir)
+
+        if args.from_cache:
+            if page_cache.needs_refresh():
+                logging.info("Page cache needs a refresh")
+                sys.exit(EXIT_CACHE_NEEDS_REFRESH)
+        else:
+            update_page_cache(page_cache, read_and_index_spots_data(), windows=windows)
+
+        blk_img, red_img = page_cache.next_page()
+
+    else:
+        pages = paginate_spots(read_and_index_spots_data())
+        page_label = None
+        if len(pages) > 1:
+            logging.warning(
+                f"Only painting the first of {len(pages)} pages of spots--use --page-cache-dir to rotate through them")
+            page_label = f"1/{len(pages)}"
+        blk_img, red_img = paint_blk_and_red_imgs(pages[0], page_label=page_label, windows=windows)
 
     if args.epaper:
+        epd_display_images = import_epd_display_images()
         if not epd_display_images:
             raise argparse.ArgumentError(
                 ep_action, "Failed to import epaper module--cannot output to epaper")
@@ -99,4 +141,5 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    with profile_from_env("paint_report_from_json"):
+        main()
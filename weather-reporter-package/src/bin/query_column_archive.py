@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import logging
+import sys
+from datetime import datetime
+
+from weather_reporter.column_archive import (COLUMN_ARCHIVE_DIR, SCHEMAS,
+                                             ColumnArchive,
+                                             compare_forecast_to_observed)
+from weather_reporter.painter import TZ, parse_local_datetime
+
+logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+TIME_COLUMNS = ("time", "fetched_at")
+
+
+def format_time(epoch_secs: float) -> str:
+    return datetime.fromtimestamp(epoch_secs, tz=TZ).isoformat()
+
+
+def format_value(value) -> str:
+    return "" if value is None else f"{value:g}"
+
+
+def main():
+    '''
+    Range scans over the column archive which `fetch_spots_json.py --column-archive-dir`
+    appends to, as CSV. E.g., forecast vs observed wind at a spot over a month:
+
+        query_column_archive.py --spot-id 187573 --start 2022-02-01 --end 2022-03-01 --compare --lead-hours 24
+    '''
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--archive-dir', default=COLUMN_ARCHIVE_DIR,
+                        help="Column archive (KITE_COLUMN_ARCHIVE_DIR)")
+    parser.add_argument('--spot-id', type=int)
+    parser.add_argument('--start', type=parse_local_datetime,
+                        help="e.g., 2022-02-01 or 2022-02-01T06:00")
+    parser.add_argument('--end', type=parse_local_datetime, default=None,
+                        help="Exclusive (default: now)")
+
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--table', choices=sorted(SCHEMAS),
+                       help="Print rows of this table")
+    group.add_argument('--compare', action='store_true', default=False,
+                       help="Print hourly mean observed wind next to the forecast for that hour")
+    group.add_argument('--sizes', action='store_true', default=False,
+                       help="Print how much space each table takes")
+
+    parser.add_argument('--columns', type=lambda s: s.split(','), default=None,
+                        help="Comma-separated columns of --table (default: all)")
+    parser.add_argument('--model', type=int, default=None,
+                        help="Only compare forecasts of this model id")
+    parser.add_argument('--lead-hours', type=float, default=0,
+                        help="Compare forecasts fetched at least this long before each hour")
+
+    args = parser.parse_args()
+
+    if not args.archive_dir:
+        parser.error("--archive-dir or KITE_COLUMN_ARCHIVE_DIR is required")
+
+    archive = ColumnArchive(args.archive_dir)
+    out = csv.writer(sys.stdout)
+
+    if args.sizes:
+        out.writerow(["table", "chunks", "bytes"])
+        out.writerows(archive.iter_sizes())
+        return
+
+    if args.spot_id is None or args.start is None:
+        parser.error("--spot-id and --start are required to query")
+    start = args.start.timestamp()
+    end = (args.end or datetime.now(TZ)).timestamp()
+
+    if args.compare:
+        out.writerow(["hour", "observed", "forecast", "error"])
+        for hour, observed, forecast in compare_forecast_to_observed(
+                archive, args.spot_id, start, end, model=args.model, lead_secs=args.lead_hours * 60 * 60):
+            error = forecast - observed if observed is not None and forecast is not None else None
+            out.writerow([format_time(hour), format_value(observed), format_value(forecast), format_value(error)])
+        return
+
+    try:
+        rows = archive.scan(args.table, args.spot_id, start, end, args.columns)
+    except ValueError as err:
+        parser.error(str(err))
+    columns = list(rows)
+    out.writerow(columns)
+    for values in zip(*rows.values()):
+        out.writerow([
+            format_time(v) if name in TIME_COLUMNS else format_value(v)
+            for name, v in zip(columns, values)
+        ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from weather_reporter.bundle_archive import ARCHIVE_DIR, archive_bundle
+from weather_reporter.column_archive import COLUMN_ARCHIVE_DIR, ColumnArchive
+from weather_reporter.fetcher import (WF_MODEL_NAME, fetch_spots_data,
+                                      get_model_id, make_wfapi_from_env)
+from weather_reporter.log import setup_rotating_file_log
+from weather_reporter.page_cache import PageCache, update_page_cache
+from weather_reporter.painter import (composite_red_blk_imgs,
+                                      normalize_spot_data)
+from weather_reporter.pipeline import (Frame, PipelinedRunner,
+                                       iter_refresh_slots, parse_hours)
+from weather_reporter.window_index import WINDOW_INDEX_PATH, WindowIndex
+
+logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+LOG_FILE_PATH = os.environ.get("KITE_LOG_FILE_PATH")
+SPOT_IDS = [int(x.strip())
+            for x in os.environ.get("KITE_SPOT_IDS", "").split(",") if x]
+PAGE_CACHE_DIR = os.environ.get("KITE_PAGE_CACHE_DIR")
+
+
+def main():
+    '''
+    Long-running alternative to `scrape_limiter_entrypoint.py`: fetches and paints
+    the next frame while the epaper display is still refreshing the current one.
+    '''
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('spotids', action='store', type=int, nargs='*')
+    parser.add_argument('--threaded', action='store_true', default=False)
+    parser.add_argument('--cycle-secs', type=int, default=20 * 60)
+    parser.add_argument('--jitter-secs', type=int, default=120)
+    parser.add_argument('--prefetch-lead-secs', type=int, default=60)
+    parser.add_argument('--hours', type=parse_hours, default=(6, 23),
+                        help="Inclusive local hours to refresh in, e.g., 6-22")
+    parser.add_argument('--max-frame-age-secs', type=int, default=None)
+    parser.add_argument('--page-cache-dir',
+                        default=PAGE_CACHE_DIR or os.path.join(tempfile.gettempdir(), "kiteink-pages"))
+    parser.add_argument('--window-index', default=WINDOW_INDEX_PATH,
+                        help="Keep a kiteable window index here, and highlight each spot's next window")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR,
+                        help="Also save fetched data here, e.g., to backfill time-lapses later")
+    parser.add_argument('--column-archive-dir', default=COLUMN_ARCHIVE_DIR,
+                        help="Also append observations and forecasts to a columnar archive here, for querying later")
+    parser.add_argument('--outdir', default=None,
+                        help="Save frames as PNGs here instead of painting to the epaper display")
+
+    args = parser.parse_args()
+
+    if LOG_FILE_PATH:
+        setup_rotating_file_log(LOG_FILE_PATH)
+
+    spot_ids = args.spotids or SPOT_IDS
+    if not spot_ids:
+        logging.error("No SPOT_IDS specified")
+        sys.exit(1)
+
+    try:
+        model_id = get_model_id(WF_MODEL_NAME)
+    except AttributeError:
+        logging.error(f"Unknown model name: {WF_MODEL_NAME}")
+        sys.exit(1)
+
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+
+        def display_frame(frame: Frame):
+            filename = datetime.fromtimestamp(frame.display_at).strftime(
+                "report-%Y-%m-%dT%H%M%S.png")
+            composite_red_blk_imgs(frame.blk_img, frame.red_img).save(
+                os.path.join(args.outdir, filename), 'png')
+    else:
+        try:
+            from weather_reporter.epaper_display import epd_display_images
+        except (ImportError, OSError) as err:
+            logging.error(f"Failed to import epaper display module: {err}")
+            sys.exit(1)
+
+        def display_frame(frame: Frame):
+            epd_display_images(frame.blk_img, frame.red_img)
+
+    wfapi = make_wfapi_from_env()
+
+    page_cache = PageCache(args.page_cache_dir)
+    windows = WindowIndex(args.window_index) if args.window_index else None
+    column_archive = ColumnArchive(args.column_archive_dir) if args.column_archive_dir else None
+
+    def make_frame(display_at: float) -> Frame:
+        if page_cache.needs_refresh():
+            logging.info(
+                f"Fetching + painting frame for {datetime.fromtimestamp(display_at)}")
+            fetched = fetch_spots_data(wfapi, spot_ids, model_id, threaded=args.threaded)
+            if args.archive_dir:
+                try:
+                    archive_bundle(args.archive_dir, fetched)
+                except OSError as err:
+                    logging.warning(f"Failed to archive fetched data: {err}")
+            if column_archive:
+                try:
+                    column_archive.append_cycle(fetched)
+                except (OSError, ValueError) as err:
+                    logging.warning(f"Failed to append fetched data to the column archive: {err}")
+            spots_data = [normalize_spot_data(d) for d in fetched]
+            if windows:
+                # The index is optional--never let it stop the display from updating
+                try:
+                    windows.update(spots_data)
+                    windows.save()
+                except Exception as err:
+                    logging.warning(f"Failed to update the window index: {err!r}")
+            update_page_cache(page_cache, spots_data, windows=windows)
+        else:
+            logging.info(
+                f"Using next cached page for {datetime.fromtimestamp(display_at)}")
+        blk_img, red_img = page_cache.next_page()
+        return Frame(display_at=display_at, fetched_at=page_cache.manifest.fetched_at,
+                     blk_img=blk_img, red_img=red_img)
+
+    runner = PipelinedRunner(
+        make_frame=make_frame,
+        display_frame=display_frame,
+        slots=iter_refresh_slots(
+            args.cycle_secs, jitter_secs=args.jitter_secs, active_hours=args.hours),
+        prefetch_lead_secs=args.prefetch_lead_secs,
+        max_frame_age_secs=args.max_frame_age_secs,
+    )
+    runner.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import sys
+
+from weather_reporter.wf_simulator import (WeatherflowSimulator,
+                                          add_simulator_args,
+                                          get_simulator_config)
+
+logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+
+def main():
+    '''
+    Serve a local stand-in for the Weatherflow API and ikitesurf login, e.g., to
+    run `fetch_spots_json.py` against
+    '''
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    add_simulator_args(parser)
+
+    args = parser.parse_args()
+
+    sim = WeatherflowSimulator(get_simulator_config(args), host=args.host, port=args.port)
+    logging.info(f"Simulating Weatherflow at {sim.url}. Point clients at it with:")
+    for name in ("WF_API_URL", "WF_LOGIN_URL", "WF_ANONYMOUS_URL"):
+        print(f"export {name}={sim.url}")
+    sys.stdout.flush()
+    try:
+        sim.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logging.info(f"Served: {dict(sim.stats)}")
+        sim.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import concurrent.futures
+import logging
+import os
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import takewhile
+from typing import (BinaryIO, Callable, Deque, Iterable, Iterator, List,
+                    Optional, Sequence, Tuple, TypeVar)
+
+from PIL import GifImagePlugin, Image
+
+from weather_reporter.bundle_archive import read_bundle
+from weather_reporter.painter import (DIMENSIONS, normalize_spot_data,
+                                      paginate_spots, paint_blk_and_red_imgs)
+from weather_reporter.pipeline import iter_refresh_slots
+
+# Frames use a fixed palette, so that they can share a GIF's global color table
+PALETTE_WHITE, PALETTE_BLACK, PALETTE_RED = 0, 1, 2
+PALETTE = [255, 255, 255, 0, 0, 0, 255, 0, 0]
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+@lru_cache(maxsize=2)
+def load_bundle(path: str) -> List[dict]:
+    # Consecutive frames mostly show the same bundle, so keep the last one or two around
+    return [normalize_spot_data(d) for d in read_bundle(path)]
+
+
+@dataclass(frozen=True)
+class BackfillFrame:
+    index: int
+    render_at: float
+    bundle_path: str
+    # Frames since this bundle was fetched, to rotate through its pages like `PageCache`
+    shown: int
+
+
+def plan_frames(
+    bundles: Sequence[Tuple[float, str]], start: float, end: float, cycle_secs: float,
+    active_hours: Tuple[int, int] = (0, 24), max_bundle_age_secs: Optional[float] = None,
+) -> Iterator[BackfillFrame]:
+    '''
+    A frame for every refresh cycle from `start` to `end`, showing the latest bundle
+    fetched by then. Cycles without a (recent enough) bundle are skipped
+    '''
+    fetched_ats = [fetched_at for fetched_at, _ in bundles]
+    index = 0
+    last_bundle = None
+    shown = 0
+    for render_at in takewhile(lambda t: t < end, iter_refresh_slots(
+            cycle_secs, active_hours=active_hours, start=start)):
+        i = bisect_right(fetched_ats, render_at) - 1
+        if i < 0:
+            continue
+        fetched_at, bundle_path = bundles[i]
+        if max_bundle_age_secs is not None and render_at - fetched_at > max_bundle_age_secs:
+            continue
+        shown = shown + 1 if bundle_path == last_bundle else 0
+        last_bundle = bundle_path
+        yield BackfillFrame(index=index, render_at=render_at, bundle_path=bundle_path, shown=shown)
+        index += 1
+
+
+def render_frame(frame: BackfillFrame) -> Image.Image:
+    '''
+    Paint a frame as it was shown, as a "P" image with `PALETTE`
+    '''
+    pages = paginate_spots(load_bundle(frame.bundle_path))
+    page = frame.shown % len(pages)
+    blk_img, red_img = paint_blk_and_red_imgs(
+        pages[page], page_label=f"{page + 1}/{len(pages)}" if len(pages) > 1 else None,
+        now=datetime.fromtimestamp(frame.render_at, tz=timezone.utc))
+
+    img = Image.new("P", DIMENSIONS, PALETTE_WHITE)
+    img.putpalette(PALETTE)
+    # Red is painted over black, like `composite_red_blk_imgs`
+    for plane, color in ((blk_img, PALETTE_BLACK), (red_img, PALETTE_RED)):
+        img.paste(color, (0, 0), plane.convert("L").point(lambda v: 0 if v else 255, "1"))
+    return img
+
+
+def get_frame_filename(frame: BackfillFrame) -> str:
+    rendered_at = datetime.fromtimestamp(frame.render_at, tz=timezone.utc)
+    return rendered_at.strftime(f"frame-{frame.index:05d}-%Y%m%dT%H%M%SZ.png")
+
+
+def save_png_frame(frame: BackfillFrame, outdir: str) -> str:
+    '''
+    Render a frame into `outdir` (in a worker process). Returns its path
+    '''
+    path = os.path.join(outdir, get_frame_filename(frame))
+    render_frame(frame).save(path, 'png')
+    return path
+
+
+def encode_gif_frame(frame: BackfillFrame, duration_ms: int) -> bytes:
+    '''
+    Render a frame as GIF image blocks (in a worker process), to append to a `GifStreamWriter`
+    '''
+    return b''.join(GifImagePlugin.getdata(render_frame(frame), duration=duration_ms))
+
+
+class GifStreamWriter:
+    '''
+    Writes an animated GIF a frame at a time, rather than holding every frame
+    in memory like `Image.save(..., save_all=True)`
+    '''
+
+    def __init__(self, fp: BinaryIO, size: Tuple[int, int] = DIMENSIONS, loop: int = 0):
+        self.fp = fp
+        header_img = Image.new("P", size, PALETTE_WHITE)
+        header_img.putpalette(PALETTE)
+        header, _ = GifImagePlugin.getheader(header_img, info={"loop": loop})
+        for block in header:
+            fp.write(block)
+
+    def write_frame(self, blocks: bytes):
+        self.fp.write(blocks)
+
+    def close(self):
+        self.fp.write(b";")  # GIF trailer
+        self.fp.close()
+
+
+def map_bounded(
+    executor: concurrent.futures.Executor, fn: Callable[[T], R], items: Iterable[T], max_in_flight: int,
+) -> Iterator[R]:
+    '''
+    Like `executor.map`, but only submits `max_in_flight` items ahead of the results
+    consumed, so neither pending items nor finished results pile up in memory
+    '''
+    in_flight: Deque[concurrent.futures.Future] = deque()
+    for item in items:
+        in_flight.append(executor.submit(fn, item))
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+def render_frames(
+    frames: Iterable[BackfillFrame], render: Callable[[BackfillFrame], R],
+    processes: Optional[int] = None,
+) -> Iterator[R]:
+    '''
+    Render frames across a process pool, yielding results in frame order
+    '''
+    processes = processes or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        yield from map_bounded(executor, render, frames, max_in_flight=processes * 2)
+
+
+def log_progress(results: Iterable[R], every: int = 100) -> Iterator[R]:
+    count = 0
+    for count, result in enumerate(results, start=1):
+        if count % every == 0:
+            logging.info(f"Rendered {count} frames")
+        yield result
+    logging.info(f"Rendered {count} frames in total")
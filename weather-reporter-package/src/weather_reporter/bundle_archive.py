@@ -0,0 +1,87 @@
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+ARCHIVE_DIR = os.environ.get("KITE_ARCHIVE_DIR")
+
+# Each bundle is ~20KB per spot, i.e., ~550MB per spot-year at 20 minute cycles.
+# Bundles older than this are removed as new ones are archived
+ARCHIVE_MAX_AGE_DAYS = float(os.environ.get("KITE_ARCHIVE_MAX_AGE_DAYS", 30))
+# ...as are the oldest ones over this total size, if set
+ARCHIVE_MAX_MB = os.environ.get("KITE_ARCHIVE_MAX_MB")
+
+BUNDLE_FILENAME_FORMAT = "spots-%Y%m%dT%H%M%SZ.json.gz"
+
+
+def archive_bundle(
+    archive_dir: str, spots_data: list, fetched_at: Optional[datetime] = None,
+    max_age_secs: Optional[float] = ARCHIVE_MAX_AGE_DAYS * 24 * 60 * 60,
+    max_bytes: Optional[int] = int(float(ARCHIVE_MAX_MB) * 1024 * 1024) if ARCHIVE_MAX_MB else None,
+) -> str:
+    '''
+    Save fetched spots data (as output by `fetch_spots_json.py`) for backfilling later,
+    then prune the archive--see `prune_bundles`
+    '''
+    fetched_at = fetched_at or datetime.now(timezone.utc)
+    path = os.path.join(
+        archive_dir, fetched_at.astimezone(timezone.utc).strftime(BUNDLE_FILENAME_FORMAT))
+    os.makedirs(archive_dir, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, 'wt') as fp:
+        json.dump(spots_data, fp)
+    os.replace(tmp_path, path)
+    prune_bundles(archive_dir, fetched_at.timestamp() - max_age_secs if max_age_secs else None, max_bytes)
+    return path
+
+
+def prune_bundles(archive_dir: str, older_than: Optional[float] = None, max_bytes: Optional[int] = None) -> List[str]:
+    '''
+    Remove bundles fetched before `older_than` (epoch secs), then the oldest bundles
+    until the rest total at most `max_bytes`--though never the newest. Returns removed paths
+    '''
+    bundles = list_bundles(archive_dir)
+    removed = []
+    sizes = []
+    for fetched_at, path in bundles:
+        try:
+            if older_than is not None and fetched_at < older_than:
+                os.remove(path)
+                removed.append(path)
+            else:
+                sizes.append((path, os.path.getsize(path)))
+        except FileNotFoundError:
+            pass  # Pruned by another process
+
+    total = sum(size for _, size in sizes)
+    for path, size in sizes[:-1]:
+        if max_bytes is None or total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed.append(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return removed
+
+
+def list_bundles(archive_dir: str) -> List[Tuple[float, str]]:
+    '''
+    Archived bundles as (fetched at epoch secs, path), oldest first--read from filenames only
+    '''
+    bundles = []
+    for filename in os.listdir(archive_dir):
+        try:
+            fetched_at = datetime.strptime(filename, BUNDLE_FILENAME_FORMAT).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        bundles.append((fetched_at.timestamp(), os.path.join(archive_dir, filename)))
+    return sorted(bundles)
+
+
+def read_bundle(path: str) -> List[dict]:
+    with gzip.open(path, 'rt') as fp:
+        spots_data = json.load(fp)
+    return spots_data if isinstance(spots_data, list) else [spots_data]
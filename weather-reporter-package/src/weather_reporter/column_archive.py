@@ -0,0 +1,360 @@
+import json
+import logging
+import os
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import accumulate
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+COLUMN_ARCHIVE_DIR = os.environ.get("KITE_COLUMN_ARCHIVE_DIR")
+
+MAGIC = b"KCOL"
+FORMAT_VERSION = 1
+CHUNK_SUFFIX = ".col"
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    # `array` typecode the column is stored as
+    typecode: str
+    # Floats are stored as ints of `value * scale`
+    scale: int = 1
+    # Store differences from the previous value, e.g., for sorted times
+    delta: bool = False
+
+    @property
+    def null(self) -> int:
+        return -(1 << (8 * array(self.typecode).itemsize - 1))
+
+    def encode(self, values: Sequence[Optional[float]]) -> bytes:
+        ints = [self.null if v is None else round(v * self.scale) for v in values]
+        if self.delta:
+            ints = [b - a for a, b in zip([0] + ints, ints)]
+        arr = array(self.typecode, ints)
+        if sys.byteorder == 'big':
+            arr.byteswap()
+        return zlib.compress(arr.tobytes(), 9)
+
+    def decode(self, data: bytes) -> List[Optional[float]]:
+        arr = array(self.typecode)
+        arr.frombytes(zlib.decompress(data))
+        if sys.byteorder == 'big':
+            arr.byteswap()
+        ints: Iterable[int] = accumulate(arr) if self.delta else arr
+        if self.scale == 1:
+            return [None if v == self.null else v for v in ints]
+        return [None if v == self.null else v / self.scale for v in ints]
+
+
+# Both tables are keyed (and partitioned) by `time`: when a wind was observed, or
+# the hour a forecast is for. `fetched_at` is when a forecast was fetched.
+SCHEMAS: Dict[str, Tuple[Column, ...]] = {
+    "obs": (
+        Column("time", 'q', delta=True),
+        Column("wind_avg", 'h', scale=10),
+        Column("wind_gust", 'h', scale=10),
+        Column("wind_dir", 'h'),
+    ),
+    "forecast": (
+        Column("time", 'q', delta=True),
+        Column("fetched_at", 'q', delta=True),
+        Column("model", 'i'),
+        Column("wind_speed", 'h', scale=10),
+        Column("wind_gust", 'h', scale=10),
+        Column("wind_dir", 'h'),
+    ),
+}
+
+
+def get_day(epoch_secs: float) -> str:
+    return datetime.fromtimestamp(epoch_secs, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def parse_wf_datetime(strn: str) -> datetime:
+    '''
+    e.g., `2022-02-10 18:00:00+0000`. Like `painter.parse_iso_datetime`,
+    without importing the painter (and PIL) into the fetch
+    '''
+    return datetime.strptime(strn, "%Y-%m-%d %H:%M:%S%z")
+
+
+def write_chunk(path: str, table: str, rows: Dict[str, Sequence[Optional[float]]],
+                merged: Sequence[str] = ()):
+    '''
+    Write a chunk: a header indexing each column's compressed bytes, so that
+    readers can seek to just the columns they need
+    '''
+    blobs = [(column.name, column.encode(rows[column.name])) for column in SCHEMAS[table]]
+    offsets, offset = {}, 0
+    for name, blob in blobs:
+        offsets[name] = [offset, len(blob)]
+        offset += len(blob)
+    header = json.dumps({
+        "version": FORMAT_VERSION, "table": table, "rows": len(rows["time"]),
+        "columns": offsets, "merged": list(merged),
+    }).encode()
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as fp:
+        fp.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for _, blob in blobs:
+            fp.write(blob)
+    os.replace(tmp_path, path)
+
+
+def read_chunk_header(fp) -> Tuple[dict, int]:
+    '''
+    Returns the header and where the column data starts
+    '''
+    prefix = fp.read(len(MAGIC) + 4)
+    if prefix[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"Not an archive chunk: {fp.name}")
+    header_len, = struct.unpack("<I", prefix[len(MAGIC):])
+    return json.loads(fp.read(header_len)), len(prefix) + header_len
+
+
+def read_chunk(path: str, table: str, columns: Sequence[str]) -> Dict[str, List[Optional[float]]]:
+    schema = {column.name: column for column in SCHEMAS[table]}
+    with open(path, 'rb') as fp:
+        header, data_start = read_chunk_header(fp)
+        out = {}
+        for name in columns:
+            offset, length = header["columns"][name]
+            fp.seek(data_start + offset)
+            out[name] = schema[name].decode(fp.read(length))
+    return out
+
+
+class ColumnArchive:
+    '''
+    Observations and model forecasts from every fetch, as compressed columns
+    partitioned by table, spot and (UTC) day:
+
+        {root}/{table}/{spot_id}/{day}.{fetched at}.col   # One chunk per fetch...
+        {root}/{table}/{spot_id}/{day}.col                # ...compacted once the day is over
+
+    Only new observations, and forecast hours which changed since the last fetch, are
+    appended, so a fetch which repeats the last one's data costs nothing. Range scans
+    read only the partitions in range, and only the columns asked for.
+    '''
+
+    def __init__(self, root: str):
+        self.root = root
+        self.state_path = os.path.join(root, "state.json")
+        self.state = self._load_state()
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path) as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            pass
+        except ValueError as err:
+            logging.warning(f"Ignoring unreadable column archive state {self.state_path}: {err}")
+        return {"last_obs": {}, "forecasts": {}}
+
+    def _save_state(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w') as fp:
+            json.dump(self.state, fp)
+        os.replace(tmp_path, self.state_path)
+
+    def _spot_dir(self, table: str, spot_id: int) -> str:
+        return os.path.join(self.root, table, str(spot_id))
+
+    def _get_partitions(self, table: str, spot_id: int) -> Dict[str, List[str]]:
+        '''
+        Chunk filenames by day
+        '''
+        try:
+            filenames = os.listdir(self._spot_dir(table, spot_id))
+        except FileNotFoundError:
+            return {}
+        partitions: Dict[str, List[str]] = {}
+        for filename in sorted(filenames):
+            if filename.endswith(CHUNK_SUFFIX):
+                partitions.setdefault(filename.split(".")[0], []).append(filename)
+        return partitions
+
+    def _append(self, table: str, spot_id: int, rows: List[dict], stamp: int) -> int:
+        by_day: Dict[str, List[dict]] = {}
+        for row in rows:
+            by_day.setdefault(get_day(row["time"]), []).append(row)
+        spot_dir = self._spot_dir(table, spot_id)
+        os.makedirs(spot_dir, exist_ok=True)
+        for day, day_rows in by_day.items():
+            write_chunk(os.path.join(spot_dir, f"{day}.{stamp}{CHUNK_SUFFIX}"), table,
+                        {column.name: [row[column.name] for row in day_rows] for column in SCHEMAS[table]})
+        return len(rows)
+
+    def append_cycle(self, spots_data: Sequence[dict], fetched_at: Optional[float] = None) -> Dict[str, int]:
+        '''
+        Append fetched spots data (as output by `fetch_spots_json.py`). Returns the
+        number of rows appended to each table
+        '''
+        fetched_at = int(fetched_at if fetched_at is not None else datetime.now(timezone.utc).timestamp())
+        appended = {"obs": 0, "forecast": 0}
+
+        for spot_data in spots_data:
+            models = spot_data["models"]
+            spot_id = int(next(iter(models.values()))["spot_id"])
+            graph_summary = spot_data["graph_summary"]
+
+            # Observations overlap from fetch to fetch, so only append newer ones. Skip nulls:
+            # getGraph pads the series with a null "virtual" observation an hour from now
+            # (`null_ob_min_from_now`), which would otherwise hide the real ones to come
+            last_obs = self.state["last_obs"].get(str(spot_id), 0)
+            gusts = dict(graph_summary.get("wind_gust_data") or [])
+            dirs = dict(graph_summary.get("wind_dir_data") or [])
+            obs = [
+                {"time": int(ms // 1000), "wind_avg": avg, "wind_gust": gusts.get(ms), "wind_dir": dirs.get(ms)}
+                for ms, avg in graph_summary.get("wind_avg_data") or []
+                if avg is not None and ms // 1000 > last_obs
+            ]
+            if obs:
+                obs.sort(key=lambda row: row["time"])
+                appended["obs"] += self._append("obs", spot_id, obs, fetched_at)
+                self.state["last_obs"][str(spot_id)] = obs[-1]["time"]
+
+            for model, model_data in models.items():
+                key = f"{spot_id}:{model}"
+                last = self.state["forecasts"].get(key, {})
+                current = {}
+                changed = []
+                for item in model_data["model_data"]:
+                    t = int(parse_wf_datetime(item["model_time_utc"]).timestamp())
+                    values = [item["wind_speed"], item["wind_gust"], item["wind_dir"]]
+                    current[str(t)] = values
+                    if last.get(str(t)) != values:
+                        changed.append({
+                            "time": t, "fetched_at": fetched_at, "model": int(model),
+                            "wind_speed": values[0], "wind_gust": values[1], "wind_dir": values[2],
+                        })
+                if changed:
+                    changed.sort(key=lambda row: row["time"])
+                    appended["forecast"] += self._append("forecast", spot_id, changed, fetched_at)
+                self.state["forecasts"][key] = current
+
+            for table in SCHEMAS:
+                self.compact(table, spot_id, before_day=get_day(fetched_at))
+
+        self._save_state()
+        logging.info(f"Archived {appended['obs']} observations and {appended['forecast']} changed forecast hours")
+        return appended
+
+    def compact(self, table: str, spot_id: int, before_day: str):
+        '''
+        Merge each finished day's chunks into one, which compresses much better
+        than many small chunks (and takes fewer blocks on disk)
+        '''
+        spot_dir = self._spot_dir(table, spot_id)
+        for day, filenames in self._get_partitions(table, spot_id).items():
+            compacted = f"{day}{CHUNK_SUFFIX}"
+            if day >= before_day or filenames == [compacted]:
+                continue
+            chunks = self._get_live_chunks(spot_dir, day, filenames)
+            columns = [column.name for column in SCHEMAS[table]]
+            merged: Dict[str, list] = {name: [] for name in columns}
+            for filename in chunks:
+                rows = read_chunk(os.path.join(spot_dir, filename), table, columns)
+                for name in columns:
+                    merged[name].extend(rows[name])
+            order = sorted(range(len(merged["time"])), key=lambda i: merged["time"][i])
+            others = [f for f in filenames if f != compacted]
+            write_chunk(os.path.join(spot_dir, compacted), table,
+                        {name: [values[i] for i in order] for name, values in merged.items()},
+                        merged=others)
+            for filename in others:
+                os.remove(os.path.join(spot_dir, filename))
+
+    def _get_live_chunks(self, spot_dir: str, day: str, filenames: List[str]) -> List[str]:
+        '''
+        A day's chunks, less any already merged into its compacted chunk--which
+        are only left behind if compaction was interrupted before removing them
+        '''
+        compacted = f"{day}{CHUNK_SUFFIX}"
+        if compacted not in filenames:
+            return filenames
+        with open(os.path.join(spot_dir, compacted), 'rb') as fp:
+            header, _ = read_chunk_header(fp)
+        return [compacted] + [f for f in filenames if f != compacted and f not in header["merged"]]
+
+    def scan(self, table: str, spot_id: int, start: float, end: float,
+             columns: Optional[Sequence[str]] = None) -> Dict[str, list]:
+        '''
+        Rows with `start <= time < end`, as lists by column, ordered by time (and then
+        by when they were appended). Reads only the days in range and the columns asked for.
+        '''
+        schema = [column.name for column in SCHEMAS[table]]
+        columns = list(columns or schema)
+        unknown = set(columns) - set(schema)
+        if unknown:
+            raise ValueError(f"Unknown {table} columns: {', '.join(sorted(unknown))}")
+        read_columns = columns if "time" in columns else ["time", *columns]
+
+        spot_dir = self._spot_dir(table, spot_id)
+        first_day, last_day = get_day(start), get_day(max(start, end - 1))
+        out: Dict[str, list] = {name: [] for name in read_columns}
+        for day, filenames in self._get_partitions(table, spot_id).items():
+            if not first_day <= day <= last_day:
+                continue
+            for filename in self._get_live_chunks(spot_dir, day, filenames):
+                rows = read_chunk(os.path.join(spot_dir, filename), table, read_columns)
+                keep = [i for i, t in enumerate(rows["time"]) if start <= t < end]
+                for name in read_columns:
+                    values = rows[name]
+                    out[name].extend(values[i] for i in keep)
+
+        order = sorted(range(len(out["time"])), key=lambda i: out["time"][i])
+        return {name: [out[name][i] for i in order] for name in columns}
+
+    def iter_sizes(self) -> Iterator[Tuple[str, int, int]]:
+        '''
+        (table, number of chunks, total bytes) for each table
+        '''
+        for table in SCHEMAS:
+            num_chunks, total = 0, 0
+            for dirpath, _, filenames in os.walk(os.path.join(self.root, table)):
+                for filename in filenames:
+                    num_chunks += 1
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+            yield table, num_chunks, total
+
+
+def compare_forecast_to_observed(
+    archive: ColumnArchive, spot_id: int, start: float, end: float,
+    model: Optional[int] = None, lead_secs: float = 0,
+) -> List[Tuple[int, Optional[float], Optional[float]]]:
+    '''
+    (hour, mean observed wind, forecast wind) for each hour from `start` to `end`. The
+    forecast is the latest one fetched at least `lead_secs` before the hour.
+    '''
+    hour = 60 * 60
+    first_hour = int(start // hour * hour)
+
+    obs = archive.scan("obs", spot_id, first_hour, end, ["time", "wind_avg"])
+    observed: Dict[int, List[float]] = {}
+    for t, avg in zip(obs["time"], obs["wind_avg"]):
+        if avg is not None:
+            observed.setdefault(int(t // hour * hour), []).append(avg)
+
+    forecasts = archive.scan("forecast", spot_id, first_hour, end, ["time", "fetched_at", "model", "wind_speed"])
+    forecast: Dict[int, Tuple[float, Optional[float]]] = {}
+    for t, fetched_at, row_model, speed in zip(
+            forecasts["time"], forecasts["fetched_at"], forecasts["model"], forecasts["wind_speed"]):
+        if (model is None or row_model == model) and fetched_at <= t - lead_secs:
+            if t not in forecast or fetched_at >= forecast[t][0]:
+                forecast[t] = (fetched_at, speed)
+
+    return [
+        (t, sum(observed[t]) / len(observed[t]) if t in observed else None,
+         forecast[t][1] if t in forecast else None)
+        for t in range(first_hour, int(end), hour)
+    ]
+
@@ -0,0 +1,137 @@
+import concurrent.futures
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from weather_reporter.fetcher import fetch_spots_data
+from weather_reporter.weatherflow_api import (WeatherFlowModel,
+                                              WeatherflowApiWithWfTokenCache)
+
+API_OPERATIONS = ("getGraph", "getModelDataBySpot", "getGauge")
+
+
+def get_percentile(sorted_values: Sequence[float], percent: float) -> float:
+    '''
+    Nearest-rank percentile of already sorted values
+    '''
+    if not sorted_values:
+        return float('nan')
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+@dataclass
+class LatencyRecorder:
+    '''
+    Thread-safe latencies (in seconds) and failures, by operation
+    '''
+    latencies: Dict[str, List[float]] = field(default_factory=dict)
+    failures: Counter = field(default_factory=Counter)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @contextmanager
+    def timing(self, operation: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as err:
+            with self.lock:
+                self.failures[f"{operation}: {type(err).__name__}"] += 1
+            raise
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies.setdefault(operation, []).append(elapsed)
+
+
+class TimedWeatherflowApi(WeatherflowApiWithWfTokenCache):
+    '''
+    Records how long each call takes as a device sees it--including any token
+    refresh and retry
+    '''
+
+    def __init__(self, *args, recorder: LatencyRecorder, **kwargs):
+        self.recorder = recorder
+        super().__init__(*args, **kwargs)
+
+    def refresh_wf_token(self):
+        with self.recorder.timing("refresh_wf_token"):
+            super().refresh_wf_token()
+
+    def fetch_graph_summary(self, *args, **kwargs):
+        with self.recorder.timing("getGraph"):
+            return super().fetch_graph_summary(*args, **kwargs)
+
+    def fetch_model(self, *args, **kwargs):
+        with self.recorder.timing("getModelDataBySpot"):
+            return super().fetch_model(*args, **kwargs)
+
+    def fetch_gauge_img(self, *args, **kwargs):
+        with self.recorder.timing("getGauge"):
+            return super().fetch_gauge_img(*args, **kwargs)
+
+
+@dataclass
+class LoadReport:
+    duration_secs: float
+    devices: int
+    spots_per_cycle: int
+    cycles_ok: int
+    recorder: LatencyRecorder
+
+    def format(self) -> str:
+        lines = [
+            f"{self.devices} devices x {self.spots_per_cycle} spots in {self.duration_secs:.1f}s: "
+            f"{self.cycles_ok * self.spots_per_cycle / self.duration_secs:.1f} spots/s, "
+            f"{sum(len(self.recorder.latencies.get(k, [])) for k in API_OPERATIONS) / self.duration_secs:.1f} API requests/s",
+            f"{'operation':<20} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}",
+        ]
+        for operation, latencies in sorted(self.recorder.latencies.items()):
+            latencies = sorted(latencies)
+            lines.append(f"{operation:<20} {len(latencies):>7} " + " ".join(
+                f"{get_percentile(latencies, p) * 1000:>8.0f}" for p in (50, 95, 99, 100)))
+        for failure, count in sorted(self.recorder.failures.items()):
+            lines.append(f"failed {failure}: {count}")
+        return "\n".join(lines)
+
+
+def run_fetch_load(
+    spot_ids: Sequence[int], devices: int, cycles: int, model_id: WeatherFlowModel,
+    threaded: bool = False, username: Optional[str] = None, password: Optional[str] = None,
+    **api_kwargs,
+) -> LoadReport:
+    '''
+    Fetch `spot_ids` like `fetch_spots_json.py` does, `cycles` times back-to-back
+    from each of `devices` simulated devices at once. Each device has its own wf_token
+    cache, as on separate displays. `api_kwargs` are passed to `WeatherflowApi`, e.g., `api_url`.
+    '''
+    recorder = LatencyRecorder()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+
+        def run_device(device: int) -> int:
+            wfapi = TimedWeatherflowApi(
+                username=username, password=password, expect_upgraded=bool(username and password),
+                cache_file_path=os.path.join(cache_dir, f"wftoken-{device}.txt"),
+                recorder=recorder, **api_kwargs)
+            cycles_ok = 0
+            for _ in range(cycles):
+                try:
+                    with recorder.timing("cycle"):
+                        fetch_spots_data(wfapi, spot_ids, model_id, threaded=threaded)
+                    cycles_ok += 1
+                except Exception:
+                    pass  # Recorded, and the next cycle goes ahead like the next cron run would
+            return cycles_ok
+
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=devices) as exe:
+            cycles_ok = sum(exe.map(run_device, range(devices)))
+        duration = time.perf_counter() - start
+
+    return LoadReport(duration_secs=duration, devices=devices, spots_per_cycle=len(spot_ids),
+                      cycles_ok=cycles_ok, recorder=recorder)
@@ -0,0 +1,61 @@
+import concurrent.futures
+import logging
+import os
+import re
+from base64 import b64encode
+from typing import Iterable, List
+
+from weather_reporter.weatherflow_api import (WeatherflowApi, WeatherFlowModel,
+                                              WeatherflowApiWithWfTokenCache)
+
+WF_MODEL_NAME = re.sub(r'\W', '_', os.environ.get("WF_MODEL_NAME", "Quicklook").lower())
+
+
+def get_model_id(model_name: str = WF_MODEL_NAME) -> WeatherFlowModel:
+    '''
+    Raises `AttributeError` for an unknown model name
+    '''
+    return getattr(WeatherFlowModel, model_name)
+
+
+def make_wfapi_from_env() -> WeatherflowApiWithWfTokenCache:
+    username = os.environ.get("WF_USERNAME", None)
+    pw = os.environ.get("WF_PASSWORD", None)
+    return WeatherflowApiWithWfTokenCache(
+        username=username, password=pw, expect_upgraded=bool(username and pw))
+
+
+def fetch_spot_data(wfapi: WeatherflowApi, spot_id: str, model_id: WeatherFlowModel) -> dict:
+    logging.info(f"Fetching spot {spot_id} (with model {model_id})")
+    graph_summary_data = wfapi.fetch_graph_summary(spot_id)
+    model_data = wfapi.fetch_model(spot_id, model_id)
+
+    gauge_img = wfapi.fetch_gauge_img(
+        # Decide if this is reasonable
+        int(graph_summary_data["last_ob_avg"] or 0),
+        graph_summary_data["last_ob_dir"],
+        graph_summary_data["last_ob_dir_txt"]
+    )
+
+    return (
+        {
+            "graph_summary": graph_summary_data,
+            "models": {
+                model_id.value: model_data
+            },
+            "gauge_img": b64encode(gauge_img.read()).decode('utf8')
+        }
+    )
+
+
+def fetch_spots_data(wfapi: WeatherflowApi, spot_ids: Iterable[str], model_id: WeatherFlowModel,
+                     threaded: bool = False) -> List[dict]:
+
+    def _fetch_spot_data(spot_id: str):
+        return fetch_spot_data(wfapi, spot_id, model_id)
+
+    if threaded:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as exe:
+            return list(exe.map(_fetch_spot_data, spot_ids))
+
+    return [_fetch_spot_data(spot_id) for spot_id in spot_ids]
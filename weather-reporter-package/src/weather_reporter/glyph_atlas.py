@@ -0,0 +1,296 @@
+import base64
+import json
+import logging
+import os
+import string
+import tempfile
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+from PIL import __version__ as PIL_VERSION
+
+GLYPH_ATLAS_PATH = os.environ.get(
+    "KITE_GLYPH_ATLAS_PATH", os.path.join(tempfile.gettempdir(), "kiteink-glyph-atlas.json"))
+
+ATLAS_VERSION = 1
+
+# Any glyph whose ink starts this far left of its pen position is rendered with FreeType instead
+MAX_NEGATIVE_BEARING = 8
+
+# Composed labels are cached too, but times etc. change so don't keep them forever
+MAX_CACHED_TEXT_MASKS = 1024
+
+BBox = Tuple[int, int, int, int]
+
+
+@dataclass
+class Glyph:
+    '''
+    A pre-rasterized glyph and the metrics needed to lay it out like FreeType does.
+
+    FreeType positions a line of text by the union of its glyphs' bounding boxes, but
+    draws each glyph at its bitmap's position--these can differ by a pixel for a pixel font,
+    so we keep both (all in pixels):
+    - `ink_dx`: left of the ink relative to the pen position
+    - `bitmap_left`/`cbox_left`: left of the bitmap/bounding box relative to the pen, if < 0
+    - `cbox_dy`: top of the bounding box below the text origin (the `y` passed to `ImageDraw.text`)
+    - `bitmap_top`: top of the bitmap relative to that of the atlas' reference glyph
+    - `ink_top`: rows between the top of the bitmap and the top of the ink
+    '''
+    advance: int
+    ink_dx: int = 0
+    bitmap_left: int = 0
+    cbox_left: int = 0
+    cbox_dy: int = 0
+    bitmap_top: int = 0
+    ink_top: int = 0
+    width: int = 0
+    height: int = 0
+    bits: str = ''  # base64 of the "1" mode ink bitmap, `Image.tobytes()`
+
+    def get_mask(self) -> Optional[Image.Image]:
+        if not self.width:
+            return None
+        return Image.frombytes("1", (self.width, self.height), base64.b64decode(self.bits))
+
+
+class GlyphAtlas:
+    '''
+    The glyphs of one font at one size, rasterized once (lazily) into 1-bit bitmaps.
+
+    Drawing composes a text mask from the glyph bitmaps using the same layout rules as
+    Pillow's basic FreeType layout--so for the fonts we use (a pixel font without kerning)
+    the result matches `ImageDraw.text(..., font=font)` on a "1" image pixel-for-pixel.
+    Text with glyphs that can't be handled that way falls back to FreeType.
+    '''
+
+    def __init__(self, font_path: str, size: int, glyphs: Optional[Dict[str, Glyph]] = None):
+        self.font_path = font_path
+        self.size = size
+        self.glyphs: Dict[str, Glyph] = glyphs or {}
+        self.dirty = False
+        self._text_masks: Dict[str, Tuple[Optional[Image.Image], int, int]] = {}
+        self._reference: Optional[Tuple[str, int]] = None
+
+    @property
+    def font(self) -> ImageFont.FreeTypeFont:
+        return get_freetype_font(self.font_path, self.size)
+
+    @property
+    def ascent(self) -> int:
+        return self.font.getmetrics()[0]
+
+    def _render_ink(self, text: str, split_x: Optional[int] = None) -> Tuple[Image.Image, List[Optional[BBox]]]:
+        '''
+        Render with FreeType exactly as the painter would. Returns the ink (as a "1" mask) and
+        its bounding box relative to the text origin--or those of the ink left and right of `split_x`
+        '''
+        font = self.font
+        pad = self.size * 2
+        img = Image.new("1", (int(font.getlength(text)) + 2 * pad, 2 * pad + self.size), 1)
+        ImageDraw.Draw(img).text((pad, pad), text, font=font, fill=0)
+        ink = img.convert("L").point(lambda v: 0 if v else 255, "1")
+        region_xs = [0] if split_x is None else [0, pad + split_x]
+        bboxes = []
+        for x0, x1 in zip(region_xs, region_xs[1:] + [ink.width]):
+            bbox = ink.crop((x0, 0, x1, ink.height)).getbbox()
+            bboxes.append(bbox and (bbox[0] + x0 - pad, bbox[1] - pad, bbox[2] + x0 - pad, bbox[3] - pad))
+        return ink, bboxes
+
+    def _get_reference(self) -> Tuple[str, int]:
+        '''
+        The tallest printable ASCII glyph, and its `ink_top`. Glyph `bitmap_top`s are relative to it
+        '''
+        if self._reference is None:
+            char = min(string.printable.strip(), key=lambda c: self.font.getbbox(c)[1])
+            _, (bbox,) = self._render_ink(char)
+            self._reference = (char, bbox[1] - self.font.getbbox(char)[1])
+        return self._reference
+
+    def _rasterize(self, char: str) -> Optional[Glyph]:
+        font = self.font
+        advance = font.getlength(char)
+        if advance != int(advance) or font.getlength(char + char) != 2 * advance:
+            # Fractional advances or kerning--can't lay out glyph by glyph
+            return None
+        advance = int(advance)
+
+        # Measure where FreeType puts the glyph after a prefix with no ink, so that the
+        # text's bounding box starts at the pen origin
+        prefix_advance = int(font.getlength(' '))
+        ink, (ink_bbox,) = self._render_ink(' ' + char)
+        if not ink_bbox:
+            return Glyph(advance=advance)
+        ink = ink.crop(ink.getbbox())
+        ink_dx = ink_bbox[0] - prefix_advance
+        cbox_left, cbox_dy, _, _ = font.getbbox(char)
+        if ink_dx < -min(prefix_advance, MAX_NEGATIVE_BEARING) or cbox_dy >= self.ascent:
+            # Too far left, or (partly) below the baseline
+            return None
+
+        # Rendered alone the text is positioned by its bounding box, which can differ from
+        # the bitmap's left edge for glyphs which start left of the pen position
+        _, (alone_bbox,) = self._render_ink(char)
+        ink_top = alone_bbox[1] - cbox_dy
+        if alone_bbox[1] != ink_bbox[1] or ink_top < 0:
+            return None
+        cbox_left = min(0, cbox_left)
+        bitmap_left = min(0, cbox_left + ink_dx - alone_bbox[0])
+
+        # The bitmap top relative to the reference glyph's, from their ink in the same line
+        reference, reference_ink_top = self._get_reference()
+        gap = int(font.getlength('  '))
+        _, (char_bbox, reference_bbox) = self._render_ink(
+            char + '  ' + reference, split_x=advance + gap // 2)
+        if not char_bbox or not reference_bbox:
+            return None
+        bitmap_top = (reference_bbox[1] - reference_ink_top) - (char_bbox[1] - ink_top)
+
+        return Glyph(
+            advance=advance, ink_dx=ink_dx, bitmap_left=bitmap_left, cbox_left=cbox_left,
+            cbox_dy=cbox_dy, bitmap_top=bitmap_top, ink_top=ink_top,
+            width=ink.width, height=ink.height,
+            bits=base64.b64encode(ink.tobytes()).decode('ascii'))
+
+    def get_glyph(self, char: str) -> Optional[Glyph]:
+        if char not in self.glyphs:
+            glyph = self._rasterize(char)
+            if glyph is None:
+                return None
+            self.glyphs[char] = glyph
+            self.dirty = True
+        return self.glyphs[char]
+
+    def get_text_mask(self, text: str) -> Tuple[Optional[Image.Image], int, int]:
+        '''
+        Returns the text's 1-bit ink mask and its offset from the text origin, or a `None`
+        mask if the text can't be composed from atlas glyphs.
+        '''
+        if text in self._text_masks:
+            return self._text_masks[text]
+        if len(self._text_masks) >= MAX_CACHED_TEXT_MASKS:
+            self._text_masks.clear()
+
+        placed = []
+        pen = 0
+        render_left = cbox_left = 0
+        cbox_dy = self.ascent
+        for char in text:
+            glyph = self.get_glyph(char)
+            if glyph is None:
+                self._text_masks[text] = (None, 0, 0)
+                return self._text_masks[text]
+            if glyph.width:
+                placed.append((pen, glyph))
+                render_left = min(render_left, pen + glyph.bitmap_left)
+                cbox_left = min(cbox_left, pen + glyph.cbox_left)
+                cbox_dy = min(cbox_dy, glyph.cbox_dy)
+            pen += glyph.advance
+
+        if not placed:
+            self._text_masks[text] = (None, 0, 0)
+            return self._text_masks[text]
+
+        # FreeType lines up the bitmap tops below the tallest bitmap, and positions the
+        # whole line by the union of the bounding boxes
+        bitmap_top = max(glyph.bitmap_top for _, glyph in placed)
+        inked = [
+            (pen + glyph.ink_dx, cbox_dy + bitmap_top - glyph.bitmap_top + glyph.ink_top, glyph)
+            for pen, glyph in placed
+        ]
+
+        x0 = min(x for x, _, _ in inked)
+        y0 = min(y for _, y, _ in inked)
+        x1 = max(x + glyph.width for x, _, glyph in inked)
+        y1 = max(y + glyph.height for _, y, glyph in inked)
+        mask = Image.new("1", (x1 - x0, y1 - y0), 0)
+        for x, y, glyph in inked:
+            mask.paste(1, (x - x0, y - y0), glyph.get_mask())
+
+        self._text_masks[text] = (mask, x0 + cbox_left - render_left, y0)
+        return self._text_masks[text]
+
+    def draw_text(self, img: Image.Image, coords: Tuple[float, float], text: str, fill: int):
+        x, y = coords
+        if x == int(x) and y == int(y):
+            mask, dx, dy = self.get_text_mask(text)
+            if mask is not None:
+                img.paste(fill, (int(x) + dx, int(y) + dy), mask)
+                return
+            if all(c == ' ' for c in text):
+                return
+
+        # Fall back to FreeType (e.g., for subpixel starts or unusual glyphs)
+        ImageDraw.Draw(img).text(coords, text, font=self.font, fill=fill)
+
+
+@lru_cache(maxsize=None)
+def get_freetype_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(font_path, size)
+
+
+def get_atlas_key(font_path: str) -> str:
+    '''
+    Rasterization depends on the font file and the FreeType/Pillow versions
+    '''
+    stat = os.stat(font_path)
+    freetype_version = ImageFont.core.freetype2_version  # type: ignore
+    return f"v{ATLAS_VERSION}:{os.path.basename(font_path)}:{stat.st_size}:{int(stat.st_mtime)}:{PIL_VERSION}:{freetype_version}"
+
+
+class GlyphAtlasStore:
+    '''
+    Glyph atlases for every (font, size) used, optionally persisted to a JSON file so
+    that cold starts don't need to rasterize anything.
+    '''
+
+    def __init__(self, path: Optional[str] = GLYPH_ATLAS_PATH):
+        self.path = path
+        self.atlases: Dict[Tuple[str, int], GlyphAtlas] = {}
+        self._saved: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return {}
+        except ValueError as err:
+            logging.warning(f"Ignoring unreadable glyph atlas {self.path}: {err}")
+            return {}
+
+    def get_atlas(self, font_path: str, size: int) -> GlyphAtlas:
+        if (font_path, size) not in self.atlases:
+            saved = self._saved.get(get_atlas_key(font_path), {}).get(str(size), {})
+            self.atlases[(font_path, size)] = GlyphAtlas(
+                font_path, size, {char: Glyph(**glyph) for char, glyph in saved.items()})
+        return self.atlases[(font_path, size)]
+
+    def save(self):
+        '''
+        Write atlases to disk, if any new glyphs were rasterized
+        '''
+        if not self.path or not any(atlas.dirty for atlas in self.atlases.values()):
+            return
+        for (font_path, size), atlas in self.atlases.items():
+            self._saved.setdefault(get_atlas_key(font_path), {})[str(size)] = {
+                char: asdict(glyph) for char, glyph in atlas.glyphs.items()
+            }
+            atlas.dirty = False
+        # Per process, as e.g. backfill workers may save at the same time
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as fp:
+                json.dump(self._saved, fp)
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            logging.warning(f"Failed to save glyph atlas {self.path}: {err}")
+
+
+@lru_cache(maxsize=None)
+def get_glyph_atlas_store() -> GlyphAtlasStore:
+    return GlyphAtlasStore()
@@ -1,20 +1,210 @@
-import os
+import atexit
+import fcntl
+import gzip
 import logging
-from logging.handlers import RotatingFileHandler
-from typing import Optional
+import os
+import queue
+import shutil
+import sys
+import time
+import traceback
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List, Optional
+
+LOG_MAX_BYTES = int(os.environ.get("KITE_LOG_MAX_BYTES", 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("KITE_LOG_BACKUP_COUNT", 5))
+LOG_MAX_AGE_SECS = int(os.environ.get("KITE_LOG_MAX_AGE_SECS", 24 * 60 * 60))
+LOG_BATCH_SIZE = int(os.environ.get("KITE_LOG_BATCH_SIZE", 64))
+LOG_FLUSH_INTERVAL_SECS = float(
+    os.environ.get("KITE_LOG_FLUSH_INTERVAL_SECS", 2))
+# e.g., "INFO,urllib3=WARNING,weather_reporter.weatherflow_api=DEBUG"
+LOG_LEVELS = os.environ.get("KITE_LOG_LEVELS", "INFO")
+
+
+def parse_log_levels(strn: str) -> Dict[str, int]:
+    '''
+    Parse a comma-separated list of `logger=LEVEL` pairs. A bare `LEVEL`
+    sets the root logger level (returned under the key `''`).
+    '''
+    levels = {}
+    for item in strn.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, level_name = item.rpartition("=")
+        level = logging.getLevelName(level_name.strip().upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Cannot parse log level of '{item}'")
+        levels[name.strip()] = level
+    return levels
+
+
+def gzip_rotator(source: str, dest: str):
+    with open(source, 'rb') as fp_in, gzip.open(dest, 'wb') as fp_out:
+        shutil.copyfileobj(fp_in, fp_out)
+    os.remove(source)
+
+
+class BatchingRotatingFileHandler(RotatingFileHandler):
+    '''
+    A `RotatingFileHandler` which
+    - buffers formatted records and writes them in batches (one write + flush per batch)
+    - rolls over when the file would exceed `max_bytes`, or when the file was last written
+      in an earlier `max_age_secs` window
+    - gzips rotated files (`kiteink.log.1.gz`, `kiteink.log.2.gz`, ...)
+    - can be shared by several processes: each batch is written (and the file rotated)
+      holding a lock on `<filename>.lock`, after reopening the file if another
+      process has rotated it away (like `WatchedFileHandler`)
+
+    Intended to be driven from a `BatchingQueueListener` thread, not the logging call sites.
+    '''
+
+    def __init__(self, filename: str, max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT,
+                 max_age_secs: int = LOG_MAX_AGE_SECS, batch_size: int = LOG_BATCH_SIZE):
+        super().__init__(filename, maxBytes=max_bytes,
+                         backupCount=backup_count, delay=True)
+        self.max_age_secs = max_age_secs
+        self.batch_size = batch_size
+        self.namer = lambda name: name + '.gz'
+        self.rotator = gzip_rotator
+        self._pending: List[str] = []
+        self._lock_fp = None
+
+    def _get_age_window(self, epoch_secs: float) -> Optional[int]:
+        if self.max_age_secs <= 0:
+            return None
+        return int(epoch_secs // self.max_age_secs)
+
+    def _reopen_if_needed(self):
+        '''
+        Reopen the file if it's not the one at `baseFilename`, e.g., because another
+        process rotated it
+        '''
+        if self.stream is not None:
+            try:
+                path_stat = os.stat(self.baseFilename)
+            except FileNotFoundError:
+                path_stat = None
+            stream_stat = os.fstat(self.stream.fileno())
+            if path_stat and (path_stat.st_dev, path_stat.st_ino) == (stream_stat.st_dev, stream_stat.st_ino):
+                return
+            self.stream.close()
+        self.stream = self._open()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self._pending.append(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._pending) >= self.batch_size:
+            self.flush()
 
+    def _should_rollover_batch(self, data: str) -> bool:
+        self.stream.seek(0, 2)
+        size = self.stream.tell()
+        # Never roll an empty file, even if a single batch is over the limit
+        if size == 0:
+            return False
+        # By when the file was last written (by any process), rather than by this process
+        file_window = self._get_age_window(os.fstat(self.stream.fileno()).st_mtime)
+        if file_window != self._get_age_window(time.time()):
+            return True
+        return self.maxBytes > 0 and size + len(data) >= self.maxBytes
 
-def setup_rotating_file_log(log_filepath: str):
-    try:
-        os.mkdir(os.path.dirname(log_filepath))
-    except FileExistsError:
-        pass
-    log_handler = RotatingFileHandler(log_filepath)
+    def flush(self):
+        self.acquire()
+        try:
+            if not self._pending:
+                return
+            data = ''.join(self._pending)
+            self._pending = []
+            if self._lock_fp is None:
+                self._lock_fp = open(self.baseFilename + ".lock", 'a')
+            fcntl.flock(self._lock_fp, fcntl.LOCK_EX)
+            try:
+                self._reopen_if_needed()
+                if self._should_rollover_batch(data):
+                    self.doRollover()
+                    self.stream = self._open()
+                self.stream.write(data)
+                self.stream.flush()
+            finally:
+                fcntl.flock(self._lock_fp, fcntl.LOCK_UN)
+        except Exception:
+            # Mirrors `Handler.handleError`, which needs a single record
+            if logging.raiseExceptions and sys.stderr:
+                sys.stderr.write("--- Logging error writing batch ---\n")
+                traceback.print_exc(file=sys.stderr)
+        finally:
+            self.release()
+
+    def close(self):
+        super().close()
+        self.acquire()
+        try:
+            if self._lock_fp is not None:
+                self._lock_fp.close()
+                self._lock_fp = None
+        finally:
+            self.release()
+
+
+class BatchingQueueListener(QueueListener):
+    '''
+    A `QueueListener` which flushes its handlers whenever the queue has been idle for
+    `flush_interval_secs`, so batched records don't sit in memory indefinitely
+    '''
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler,
+                 flush_interval_secs: float = LOG_FLUSH_INTERVAL_SECS):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval_secs = flush_interval_secs
+
+    def dequeue(self, block: bool):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_interval_secs)
+            except queue.Empty:
+                if not block:
+                    raise
+                for handler in self.handlers:
+                    handler.flush()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        super().stop()
+        for handler in self.handlers:
+            handler.flush()
+
+
+def setup_log_levels(log_levels: str = LOG_LEVELS):
+    for name, level in parse_log_levels(log_levels).items():
+        logging.getLogger(name or None).setLevel(level)
+
+
+def setup_rotating_file_log(log_filepath: str) -> BatchingQueueListener:
+    '''
+    Log to `log_filepath` via a queue so that callers never wait on SD card I/O;
+    a background thread writes records in batches and rotates/compresses the file.
+    '''
+    os.makedirs(os.path.dirname(log_filepath), exist_ok=True)
+
+    file_handler = BatchingRotatingFileHandler(log_filepath)
     formatter = logging.Formatter(
         '%(asctime)s kiteink [%(process)d]: %(message)s',
         '%b %d %H:%M:%S')
     # formatter.converter = time.gmtime  # if you want UTC time
-    log_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    listener = BatchingQueueListener(log_queue, file_handler)
+    listener.start()
+    # Registered after `logging`'s own atexit hook, so it runs first and drains the queue
+    atexit.register(listener.stop)
+
     logger = logging.getLogger()
-    logger.addHandler(log_handler)
-    logger.setLevel(logging.INFO)
+    logger.addHandler(QueueHandler(log_queue))
+    setup_log_levels()
+    return listener
@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from weather_reporter.painter import paint_pages
+
+if TYPE_CHECKING:
+    from weather_reporter.window_index import WindowIndex
+
+PAGE_CACHE_MAX_AGE_SECS = int(
+    os.environ.get("KITE_PAGE_CACHE_MAX_AGE_SECS", 2 * 60 * 60))
+
+
+@dataclass
+class PageCacheManifest:
+    fetched_at: float  # When the data these pages show was fetched (and painted)
+    num_pages: int
+    next_page: int = 0
+    shown: int = 0  # Pages shown since the data was last fetched
+
+
+class PageCache:
+    '''
+    Rendered pages of spots on disk, so that later cycles can rotate through the
+    pages without fetching or painting again.
+
+    A refresh (fetch) is due once every page has been shown since the last fetch,
+    or the pages are older than `max_age_secs`. Pages are always repainted on a
+    refresh, even if the data is unchanged, as they show the time they were painted
+    and how fresh the data is.
+    '''
+
+    def __init__(self, cache_dir: str, max_age_secs: int = PAGE_CACHE_MAX_AGE_SECS):
+        self.cache_dir = cache_dir
+        self.max_age_secs = max_age_secs
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.cache_dir, "manifest.json")
+
+    def _page_paths(self, i: int) -> Tuple[str, str]:
+        return (
+            os.path.join(self.cache_dir, f"page-{i}-blk.png"),
+            os.path.join(self.cache_dir, f"page-{i}-red.png"),
+        )
+
+    def _load_manifest(self) -> Optional[PageCacheManifest]:
+        try:
+            with open(self.manifest_path) as fp:
+                return PageCacheManifest(**json.load(fp))
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError) as err:
+            logging.warning(f"Ignoring unreadable page cache manifest: {err}")
+            return None
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as fp:
+            json.dump(asdict(self.manifest), fp)
+        os.replace(tmp_path, self.manifest_path)
+
+    def needs_refresh(self) -> bool:
+        if not self.manifest:
+            return True
+        if time.time() - self.manifest.fetched_at > self.max_age_secs:
+            return True
+        return self.manifest.shown >= self.manifest.num_pages
+
+    def store(self, pages: Sequence[Tuple[Image.Image, Image.Image]]):
+        for i, (blk_img, red_img) in enumerate(pages):
+            blk_path, red_path = self._page_paths(i)
+            blk_img.save(blk_path, 'png')
+            red_img.save(red_path, 'png')
+        self.manifest = PageCacheManifest(
+            fetched_at=time.time(), num_pages=len(pages))
+        self._save_manifest()
+
+    def next_page(self) -> Tuple[Image.Image, Image.Image]:
+        '''
+        Load the next page in the rotation and advance it
+        '''
+        if not self.manifest:
+            raise RuntimeError("No pages cached")
+        i = self.manifest.next_page % self.manifest.num_pages
+        blk_path, red_path = self._page_paths(i)
+        pages = (Image.open(blk_path), Image.open(red_path))
+        for img in pages:
+            img.load()
+        self.manifest.next_page = (i + 1) % self.manifest.num_pages
+        self.manifest.shown += 1
+        self._save_manifest()
+        return pages
+
+
+def update_page_cache(cache: PageCache, spots_data: Sequence[dict], windows: Optional['WindowIndex'] = None):
+    '''
+    Paint and store every page for freshly fetched `spots_data`
+    '''
+    pages = paint_pages(spots_data, windows=windows)
+    logging.info(f"Caching {len(pages)} painted pages")
+    cache.store(pages)
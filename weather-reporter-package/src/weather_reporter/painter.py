@@ -1,20 +1,24 @@
 import os
 import statistics
 from base64 import b64decode
-from datetime import datetime, timedelta, tzinfo
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
 from io import BytesIO
-from itertools import chain, groupby
+from itertools import groupby
 from numbers import Number
 from pathlib import Path
-from tempfile import NamedTemporaryFile
-from typing import (Callable, Iterable, Optional, Sequence, Tuple, TypedDict,
-                    Union, cast)
+from typing import (TYPE_CHECKING, Callable, Dict, List, Optional, Sequence,
+                    Tuple, Union)
+from zoneinfo import ZoneInfo
 import logging
 
-import dateutil.parser
-import pytz
-import qrcode
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
+
+from weather_reporter.glyph_atlas import GlyphAtlas, get_glyph_atlas_store
+
+if TYPE_CHECKING:
+    from weather_reporter.window_index import KiteWindow, WindowIndex
 
 # More fonts https://www.dafont.com/bitmap.php
 # https://lucid.app/lucidchart/6a918925-6ff7-4aff-91ce-f57223f1599a/edit?beaconFlowId=B86FF4B9E5FF811D&invitationId=inv_afc6c6ae-b5ad-4c89-bf62-57c523d488b7&page=0_0#
@@ -25,20 +29,74 @@ DIMENSIONS = (800, 480)
 WHITE_BIT = 1
 BLACK_BIT = 0
 
-TZ = pytz.timezone("Pacific/Honolulu")
+TZ = ZoneInfo("Pacific/Honolulu")
 
 CONSIDERED_OLD = timedelta(hours=1)
 
-THRESHOLD_SPEED_KNOTS = float(os.environ.get(
-    "HIGHLIGHT_THRESHOLD_SPEED_KNOTS", 15))
-THRESHOLD_SPEEDS = {
-    'kts': THRESHOLD_SPEED_KNOTS,
-    'mph': 1.15078 * THRESHOLD_SPEED_KNOTS,
-    'kph': 1.852 * THRESHOLD_SPEED_KNOTS,
-}
+SPOT_COL_X_START = 150
+SPOT_COL_WIDTH = 220
+# Columns are ~200px wide, so three fit to the right of the header column
+SPOTS_PER_PAGE = 3
+
+
+@dataclass(frozen=True)
+class PainterConfig:
+    threshold_speed_knots: float = 15
+    chart_speed_unit_max: int = 25
+    unit_speed_pixel_height: float = 4
+    use_glyph_atlas: bool = True
+
+    @classmethod
+    def from_env(cls) -> 'PainterConfig':
+        return cls(
+            threshold_speed_knots=float(os.environ.get(
+                "HIGHLIGHT_THRESHOLD_SPEED_KNOTS", 15)),
+            chart_speed_unit_max=int(
+                os.environ.get("CHART_SPEED_UNIT_MAX", 25)),
+            unit_speed_pixel_height=float(
+                os.environ.get("UNIT_SPEED_PIXEL_HEIGHT", 4)),
+            use_glyph_atlas=os.environ.get(
+                "KITE_GLYPH_ATLAS", "1").lower() not in ("0", "false", "no"),
+        )
+
+    @property
+    def threshold_speeds(self) -> Dict[str, float]:
+        return {
+            'kts': self.threshold_speed_knots,
+            'mph': 1.15078 * self.threshold_speed_knots,
+            'kph': 1.852 * self.threshold_speed_knots,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_painter_config() -> PainterConfig:
+    # Read lazily (rather than at import) so that importing the painter stays cheap
+    return PainterConfig.from_env()
 
-CHART_SPEED_UNIT_MAX = int(os.environ.get("CHART_SPEED_UNIT_MAX", 25))
-UNIT_SPEED_PIXEL_HEIGHT = float(os.environ.get("UNIT_SPEED_PIXEL_HEIGHT", 4))
+
+@lru_cache(maxsize=None)
+def get_zone(tz_name: str) -> tzinfo:
+    return ZoneInfo(tz_name)
+
+
+def parse_iso_datetime(strn: str) -> datetime:
+    '''
+    Parse the ISO-ish datetimes returned by Weatherflow, e.g.,
+    `2022-02-10 18:00:00+0000`, with the stdlib parser.
+
+    `datetime.fromisoformat` only accepts `+HH:MM` offsets before python 3.11
+    '''
+    if len(strn) > 5 and strn[-5] in '+-' and strn[-3] != ':':
+        strn = f"{strn[:-2]}:{strn[-2:]}"
+    return datetime.fromisoformat(strn)
+
+
+def parse_local_datetime(strn: str) -> datetime:
+    '''
+    An ISO date or datetime, in the display's time zone unless it has an offset
+    '''
+    dt = parse_iso_datetime(strn)
+    return dt if dt.tzinfo else dt.replace(tzinfo=TZ)
 
 
 def get_spot_website_url(spot_id: int):
@@ -98,7 +156,7 @@ def group_by(data: Sequence, get_key: Callable, get_value: Callable) -> GroupedD
 def group_by_hour_historical_tuples(data: Sequence[Tuple[float, float]], data_tz: tzinfo, to_tz: tzinfo) -> GroupedData:
 
     def _get_hour_key(datum) -> str:
-        dt = datetime.fromtimestamp(datum[0]/1000).replace(tzinfo=data_tz)
+        dt = datetime.fromtimestamp(datum[0]/1000, tz=data_tz)
         dt_local: datetime = dt.astimezone(to_tz)
         return get_hour_key(dt_local)
 
@@ -111,7 +169,7 @@ def group_by_hour_historical_tuples(data: Sequence[Tuple[float, float]], data_tz
 def group_by_3hr_model_items(data: Sequence[dict], to_tz: tzinfo):
 
     def _get_hour_key(datum: dict) -> str:
-        dt = dateutil.parser.isoparse(datum['model_time_utc'])
+        dt = parse_iso_datetime(datum['model_time_utc'])
         dt_local: datetime = dt.astimezone(to_tz)
         return get_3hr_key(dt_local)
 
@@ -124,7 +182,7 @@ def group_by_3hr_model_items(data: Sequence[dict], to_tz: tzinfo):
 def group_by_hour_model_items(data: Sequence[dict], to_tz: tzinfo):
 
     def _get_hour_key(datum: dict) -> str:
-        dt = dateutil.parser.isoparse(datum['model_time_utc'])
+        dt = parse_iso_datetime(datum['model_time_utc'])
         dt_local: datetime = dt.astimezone(to_tz)
         return get_hour_key(dt_local)
 
@@ -145,7 +203,7 @@ def calc_prev_5_hours_wind_mean(now_dt: datetime, graph_summary_data: dict, tz:
 
     hourlies = group_by_hour_historical_tuples(
         graph_summary_data["wind_avg_data"],
-        pytz.timezone(graph_summary_data["local_timezone"]),
+        get_zone(graph_summary_data["local_timezone"]),
         tz
     )
 
@@ -203,16 +261,45 @@ def calc_next_60_3hr_wind_mean(now_dt: datetime, model_data: dict, tz: tzinfo):
     return next_60_time_blocks
 
 
-class BarChartDatum(TypedDict):
-    value: int
-    label: Union[str, Number]
-    filled: Optional[bool]
-    red: Optional[bool]
+def normalize_graph_summary_data(graph_summary_data: dict):
+    return {
+        **graph_summary_data,
+        "last_ob_avg": graph_summary_data.get("last_ob_avg", 0)
+    }
 
 
-def paint_blk_and_red_imgs(spots_data: Sequence[dict]) -> Tuple[Image.Image, Image.Image]:
+def normalize_spot_data(spot_data: dict) -> dict:
+    return {
+        **spot_data,
+        "graph_summary": {
+            **spot_data["graph_summary"],
+            "last_ob_avg": spot_data["graph_summary"]["last_ob_avg"] or 0
+        }
+    }
+
+
+@dataclass
+class BarChartData:
     '''
-    Returns black
+    Bars as parallel arrays, rather than a dict per bar
+    '''
+    values: List[float] = field(default_factory=list)
+    labels: List[Union[str, Number]] = field(default_factory=list)
+    filled: List[bool] = field(default_factory=list)
+    red: List[bool] = field(default_factory=list)
+
+    def append(self, value: float, label: Union[str, Number], filled: bool, red: bool):
+        self.values.append(value)
+        self.labels.append(label)
+        self.filled.append(filled)
+        self.red.append(red)
+
+
+def paint_blk_and_red_imgs(spots_data: Sequence[dict], page_label: Optional[str] = None, windows: Optional['WindowIndex'] = None, now: Optional[datetime] = None) -> Tuple[Image.Image, Image.Image]:
+    '''
+    Returns black and red images. Only `SPOTS_PER_PAGE` spots fit--see `paint_pages`.
+    With a `WindowIndex`, each spot's current or next kiteable window is highlighted.
+    Paints the report as of `now` (an aware datetime), defaulting to the current time
     '''
 
     base_blk = Image.new("1", DIMENSIONS, WHITE_BIT)
@@ -222,70 +309,82 @@ def paint_blk_and_red_imgs(spots_data: Sequence[dict]) -> Tuple[Image.Image, Ima
     draw_blk = ImageDraw.Draw(base_blk)
     draw_red = ImageDraw.Draw(base_red)
 
-    fnt_40 = ImageFont.truetype(get_font_path(), 40)
-    fnt_30 = ImageFont.truetype(get_font_path(), 30)
-    fnt_20 = ImageFont.truetype(get_font_path(), 20)
-    fnt_sm = ImageFont.truetype(get_font_path(), 13)
+    config = get_painter_config()
 
-    now_local = datetime.utcnow().replace(tzinfo=pytz.UTC).astimezone(TZ)
+    # Labels are drawn from pre-rasterized glyphs, rather than laid out by FreeType every time
+    atlas_store = get_glyph_atlas_store()
+    fnt_40, fnt_30, fnt_20, fnt_sm = (
+        atlas_store.get_atlas(get_font_path(), size) for size in (40, 30, 20, 13))
 
-    def write_text(coords: Tuple[int, int], fnt: ImageFont.FreeTypeFont, text: str, red=False):
-        d = draw_red if red else draw_blk
-        d.text(coords, text, font=fnt, fill=BLACK_BIT, )
+    if now and not now.tzinfo:
+        raise RuntimeError("Refusing to paint for naive datetime")
+    now_local = (now or datetime.now(timezone.utc)).astimezone(TZ)
+
+    def write_text(coords: Tuple[int, int], fnt: GlyphAtlas, text: str, red=False):
+        if config.use_glyph_atlas:
+            fnt.draw_text(base_red if red else base_blk,
+                          coords, text, fill=BLACK_BIT)
+        else:
+            d = draw_red if red else draw_blk
+            d.text(coords, text, font=fnt.font, fill=BLACK_BIT, )
 
     # def write_bar_chart(*args, **kwargs):
     #     print("write_bar_chart", args, kwargs)
     #     return _write_bar_chart(*args, **kwargs)
 
-    def write_bar_chart(coords: Tuple[int, int], bars: Iterable[BarChartDatum], width: int = 2, red=False, pixels_per_unit=UNIT_SPEED_PIXEL_HEIGHT, x_axis_skip=2):
-        d = draw_red if red else draw_blk
-
+    def write_bar_chart(coords: Tuple[int, int], bars: BarChartData, width: int = 2, red=False, pixels_per_unit=config.unit_speed_pixel_height, x_axis_skip=2):
         x_start, y_start = coords
 
-        for j in range(CHART_SPEED_UNIT_MAX):
+        for j in range(config.chart_speed_unit_max):
             if j % 4 == 0:
                 write_text((x_start, y_start - (10 + j*pixels_per_unit)),
                            fnt_sm, str(j), red=red)
 
         x = x_start + 10
         y = y_start
-        for i, bar_datum in enumerate(bars):
-            filled = bar_datum["filled"]
-            label = bar_datum["label"]
-            value = bar_datum["value"]
-            bar_red = bar_datum.get("red", red)
+        for i, (value, filled, bar_red) in enumerate(zip(bars.values, bars.filled, bars.red)):
+            bar_x = x + i * width
             bar_d = draw_red if bar_red else draw_blk
-            rect = (x, y - 5, x + width, y - (5 + value*pixels_per_unit))
-            bar_d.rectangle(rect, outline=BLACK_BIT, fill=BLACK_BIT if filled else WHITE_BIT, width=1)
+            bar_d.rectangle((bar_x, y - 5, bar_x + width, y - (5 + value * pixels_per_unit)),
+                            outline=BLACK_BIT, fill=BLACK_BIT if filled else WHITE_BIT, width=1)
 
-            if i % x_axis_skip == 0:
-                # Print every other hour
-                write_text((x, y), fnt_sm, str(label), red=red)
-            x += width
+        for i in range(0, len(bars.labels), x_axis_skip):
+            # Print every other hour
+            label = str(bars.labels[i])
+            if label:
+                write_text((x + i * width, y), fnt_sm, label, red=red)
 
     def write_qrcode(coords: Tuple[int, int], data: str, red=False):
-        base_img = base_red if red else base_blk
-
-        with NamedTemporaryFile("wb", delete=False) as fp_w:
-            qr = qrcode.QRCode(
-                box_size=2,
-                border=1,
-            )
-            qr.add_data(data)
-            qr.make(fit=True)
-            img = qr.make_image()
-            img.save(fp_w)
+        # Imported lazily--qrcode is slow to import and only needed once per spot
+        import qrcode
 
-        with open(fp_w.name, 'rb') as fp_r:
-            qrcode_img = Image.open(fp_r)
-            base_img.paste(qrcode_img, coords)
+        base_img = base_red if red else base_blk
 
-        os.remove(fp_w.name)
+        qr = qrcode.QRCode(
+            box_size=2,
+            border=1,
+        )
+        qr.add_data(data)
+        qr.make(fit=True)
+        buf = BytesIO()
+        qr.make_image().save(buf)
+        buf.seek(0)
+        base_img.paste(Image.open(buf), coords)
+
+    def write_next_window(coords: Tuple[int, int], window: 'KiteWindow'):
+        start = datetime.fromtimestamp(window.start, tz=TZ)
+        end = datetime.fromtimestamp(window.end, tz=TZ)
+        peak = f"{window.peak:.0f} {window.units_wind}"
+        if start <= now_local:
+            text = end.strftime(f"now til %H:%M, {peak}")
+        else:
+            text = start.strftime(f"next: %a %H:%M, {peak}")
+        write_text(coords, fnt_sm, text, red=True)
 
     def paint_header_col(x_start: int, graph_summary_data: dict):
 
         units_wind = graph_summary_data["units_wind"]
-        threshold_value = THRESHOLD_SPEEDS[units_wind]
+        threshold_value = config.threshold_speeds[units_wind]
 
         write_text((x_start, 70), fnt_40, "Now")
         write_text((x_start, 110), fnt_20,
@@ -294,23 +393,26 @@ def paint_blk_and_red_imgs(spots_data: Sequence[dict]) -> Tuple[Image.Image, Ima
         write_text((x_start, 230), fnt_20, now_local.strftime("%b %d"))
         write_text((x_start, 350), fnt_40, "7 Day")
 
+        if page_label:
+            write_text((x_start, 420), fnt_20, page_label)
+
         write_text((x_start, 450), fnt_sm,
                    f"Threshold: {threshold_value} {units_wind}")
 
     def paint_spot_col(x_start: int, graph_summary_data: dict, gauge_img_data: Union[str, bytes], model_data: dict):
 
         units_wind = model_data["units_wind"]
-        threshold_value = THRESHOLD_SPEEDS[units_wind]
+        threshold_value = config.threshold_speeds[units_wind]
 
         # Write Spot title
         spot_name = graph_summary_data["name"][:8]
         write_text((x_start, 10), fnt_30, spot_name)
 
         # Write Last updated
-        last_fetch = dateutil.parser.isoparse(
+        last_fetch = parse_iso_datetime(
             graph_summary_data["current_time_local"])
         last_fetch = last_fetch.replace(
-            tzinfo=pytz.timezone(graph_summary_data["local_timezone"]))
+            tzinfo=get_zone(graph_summary_data["local_timezone"]))
         last_fetch_local = last_fetch.astimezone(TZ)
 
         if now_local - last_fetch_local > CONSIDERED_OLD:
@@ -329,6 +431,12 @@ def paint_blk_and_red_imgs(spots_data: Sequence[dict]) -> Tuple[Image.Image, Ima
         base_img.paste(gauge_img.crop((20, 20, 160, 160)
                                       ).resize((100, 100)), (x_start, 70))
 
+        # Write next kiteable window
+        window = windows and windows.next_window(
+            now_local.timestamp(), spot_id=int(model_data["spot_id"]))
+        if window:
+            write_next_window((x_start, 176), window)
+
         # Write qrcode
         write_qrcode((x_start+120, 70),
                      get_spot_website_url(model_data["spot_id"]))
@@ -342,40 +450,33 @@ def paint_blk_and_red_imgs(spots_data: Sequence[dict]) -> Tuple[Image.Image, Ima
         )]
         hourlies_future = calc_next_12_hours_wind_mean(
             now_local, model_data, TZ)
-        hourlies = [cast(BarChartDatum, x) for x in chain(
-            ({'label': hour, 'value': val, 'filled': True, "red": val >= threshold_value}
-             for hour, val in hourlies_past),
-            ({'label': hour, 'value': val, 'filled': True, "red": val >= threshold_value}
-             for hour, val in hourlies_now),
-            ({'label': hour, 'value': val, 'filled': False, "red": val >= threshold_value}
-             for hour, val in hourlies_future)
-        )]
+        hourlies = BarChartData()
+        for filled, hours in ((True, hourlies_past), (True, hourlies_now), (False, hourlies_future)):
+            for hour, val in hours:
+                hourlies.append(val, hour, filled=filled, red=val >= threshold_value)
         write_bar_chart((x_start, 300), hourlies, width=10)
 
         # Write this week bar chart
         _3hrsly_distant_future = calc_next_60_3hr_wind_mean(
             now_local, model_data, TZ)
-        _3hrlies = []
+        _3hrlies = BarChartData()
         last_seen_label = None
         for label, val in _3hrsly_distant_future:
             if not last_seen_label:
-                _3hrlies.append({"label": "", "value": val,
-                                "filled": False, "red": val >= threshold_value})
+                _3hrlies.append(val, "", filled=False, red=val >= threshold_value)
                 last_seen_label = label
             elif last_seen_label != label:
                 # Every new day gets a filled bar
-                _3hrlies.append({"label": label, "value": val,
-                                "filled": True,  "red": val >= threshold_value})
+                _3hrlies.append(val, label, filled=True, red=val >= threshold_value)
                 last_seen_label = label
             else:
-                _3hrlies.append(
-                    {"label": "", "value": val, "filled": False,  "red": val >= threshold_value})
+                _3hrlies.append(val, "", filled=False, red=val >= threshold_value)
 
         write_bar_chart((x_start, 450), _3hrlies, width=3, x_axis_skip=1)
 
     paint_header_col(10, spots_data[0]["graph_summary"])
 
-    spot_x = 150
+    spot_x = SPOT_COL_X_START
     for spot_data in spots_data:
         graph_summary_data: dict = spot_data["graph_summary"]
         if len(spot_data["models"]) > 1:
@@ -383,11 +484,31 @@ def paint_blk_and_red_imgs(spots_data: Sequence[dict]) -> Tuple[Image.Image, Ima
         model_data = list(spot_data["models"].values())[0]
         gauge_img_data: Union[str, bytes] = spot_data["gauge_img"]
         paint_spot_col(spot_x, graph_summary_data, gauge_img_data, model_data)
-        spot_x += 220
+        spot_x += SPOT_COL_WIDTH
+
+    if config.use_glyph_atlas:
+        atlas_store.save()
 
     return (base_blk, base_red)
 
 
+def paginate_spots(spots_data: Sequence[dict], spots_per_page: int = SPOTS_PER_PAGE) -> List[Sequence[dict]]:
+    return [spots_data[i:i + spots_per_page] for i in range(0, len(spots_data), spots_per_page)]
+
+
+def paint_pages(spots_data: Sequence[dict], spots_per_page: int = SPOTS_PER_PAGE, windows: Optional['WindowIndex'] = None, now: Optional[datetime] = None) -> List[Tuple[Image.Image, Image.Image]]:
+    '''
+    Paint every page of spots from one fetch. Returns a (black, red) pair per page
+    '''
+    pages = paginate_spots(spots_data, spots_per_page)
+    return [
+        paint_blk_and_red_imgs(
+            page, page_label=f"{i + 1}/{len(pages)}" if len(pages) > 1 else None,
+            windows=windows, now=now)
+        for i, page in enumerate(pages)
+    ]
+
+
 def paint_composite_img(spots_data:  Sequence[dict]) -> Image.Image:
     blk_img, red_img = paint_blk_and_red_imgs(spots_data)
     return composite_red_blk_imgs(blk_img, red_img)
@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, tzinfo
+from random import randint
+from typing import Callable, Iterator, Optional, Tuple
+
+from PIL import Image
+
+from weather_reporter.painter import TZ
+
+
+@dataclass
+class Frame:
+    display_at: float  # Epoch secs of the scheduled refresh this frame was made for
+    fetched_at: float
+    blk_img: Image.Image
+    red_img: Image.Image
+
+
+class LatestFrameSlot:
+    '''
+    A single-item mailbox between the fetch+paint producer and the epaper consumer.
+
+    At most one frame waits at a time: putting a newer frame drops any frame which
+    hasn't been taken yet, so the display never works through a backlog of stale frames.
+    '''
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame: Optional[Frame] = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, frame: Frame):
+        with self._cond:
+            if self._frame is not None:
+                logging.info(
+                    f"Dropping frame for {datetime.fromtimestamp(self._frame.display_at)}, replaced by newer frame")
+                self.dropped += 1
+            self._frame = frame
+            self._cond.notify_all()
+
+    def take(self, timeout: Optional[float] = None) -> Optional[Frame]:
+        '''
+        Block until a frame is available. Returns `None` on timeout, or once closed and empty
+        '''
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._frame is not None or self._closed, timeout)
+            frame, self._frame = self._frame, None
+            return frame
+
+    def take_if(self, predicate: Callable[[Frame], bool]) -> Optional[Frame]:
+        '''
+        Take the waiting frame without blocking, but only if it satisfies `predicate`
+        '''
+        with self._cond:
+            if self._frame is None or not predicate(self._frame):
+                return None
+            frame, self._frame = self._frame, None
+            return frame
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def parse_hours(strn: str) -> Tuple[int, int]:
+    '''
+    Parse a crontab-like inclusive hour range, e.g., `6-22`, or `22-5` past midnight,
+    into `active_hours`
+    '''
+    start, end = (int(hour) for hour in strn.split('-'))
+    if not (0 <= start <= 23 and 0 <= end <= 23):
+        raise ValueError(f"Hours must be 0-23: {strn}")
+    return (start, (end + 1) % 24)
+
+
+def is_active_hour(hour: int, active_hours: Tuple[int, int]) -> bool:
+    '''
+    Whether `hour` is in `active_hours` (start inclusive, end exclusive), which wraps
+    past midnight when start >= end, e.g., `(22, 6)`
+    '''
+    start, end = active_hours
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def iter_refresh_slots(cycle_secs: float, jitter_secs: int = 0,
+                       active_hours: Tuple[int, int] = (0, 24),
+                       start: Optional[float] = None, tz: tzinfo = TZ) -> Iterator[float]:
+    '''
+    Yields epoch secs of scheduled refreshes from `start` (by default, now--so a display
+    is refreshed right after a reboot), then `cycle_secs` apart plus some random jitter
+    (so we don't behave too much like a bot), skipping slots outside of
+    `active_hours` (in `tz`, the painter's local time--not the host's--see `is_active_hour`)
+    '''
+    slot = time.time() if start is None else start
+    jittered = slot
+    while True:
+        if is_active_hour(datetime.fromtimestamp(jittered, tz).hour, active_hours):
+            yield jittered
+        slot += cycle_secs
+        jittered = slot + randint(0, jitter_secs)
+
+
+def sleep_until(epoch_secs: float, sleep: Callable[[float], None] = time.sleep):
+    remaining = epoch_secs - time.time()
+    if remaining > 0:
+        sleep(remaining)
+
+
+@dataclass
+class PipelinedRunner:
+    '''
+    Overlap fetching+painting the next frame with the (slow, ~15s) epaper refresh.
+
+    A producer thread starts each fetch `prefetch_lead_secs` before its scheduled refresh
+    and hands the painted frame to the display loop via a `LatestFrameSlot`; meanwhile the
+    display loop is free to block in the epaper driver. So each refresh shows data fetched
+    just before it rather than a full cycle earlier.
+    '''
+    make_frame: Callable[[float], Frame]  # Called with the `display_at` of the slot
+    display_frame: Callable[[Frame], None]
+    slots: Iterator[float]
+    prefetch_lead_secs: float = 60
+    # Frames whose data is older than this when their slot comes up are not displayed
+    max_frame_age_secs: Optional[float] = None
+    sleep: Callable[[float], None] = time.sleep
+
+    def __post_init__(self):
+        self.frame_slot = LatestFrameSlot()
+        self.displayed = 0
+
+    def _produce(self):
+        try:
+            for display_at in self.slots:
+                sleep_until(display_at - self.prefetch_lead_secs, self.sleep)
+                try:
+                    frame = self.make_frame(display_at)
+                except Exception:
+                    logging.exception(
+                        f"Failed to make frame for {datetime.fromtimestamp(display_at)}")
+                    continue
+                self.frame_slot.put(frame)
+        finally:
+            self.frame_slot.close()
+
+    def _consume(self):
+        while True:
+            frame = self.frame_slot.take()
+            if frame is None:
+                return
+            sleep_until(frame.display_at, self.sleep)
+
+            # A fresher frame may have arrived while we waited for the slot
+            # (frames made for a later slot are left for then)
+            newer = self.frame_slot.take_if(
+                lambda f: f.display_at <= time.time())
+            if newer is not None:
+                logging.info("Dropping frame, replaced by newer frame")
+                self.frame_slot.dropped += 1
+                frame = newer
+
+            age = time.time() - frame.fetched_at
+            if self.max_frame_age_secs is not None and age > self.max_frame_age_secs:
+                logging.warning(f"Dropping frame with {age:.0f}s old data")
+                self.frame_slot.dropped += 1
+                continue
+
+            logging.info(f"Displaying frame with {age:.0f}s old data")
+            try:
+                self.display_frame(frame)
+                self.displayed += 1
+            except Exception:
+                logging.exception("Failed to display frame")
+
+    def run(self):
+        producer = threading.Thread(
+            target=self._produce, name="kiteink-producer", daemon=True)
+        producer.start()
+        self._consume()
+        producer.join()
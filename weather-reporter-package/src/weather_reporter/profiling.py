@@ -0,0 +1,187 @@
+import logging
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from random import random as randfloat
+from types import FrameType
+from typing import Iterator, Optional, Set
+
+# Comma-separated profilers to enable, any of: "cprofile", "tracemalloc", "sample"
+PROFILE = os.environ.get("KITE_PROFILE", "")
+# Only profile this fraction of runs, e.g., "1/10"
+PROFILE_PROBABILITY = os.environ.get("KITE_PROFILE_PROBABILITY", "1")
+PROFILE_SAMPLE_INTERVAL_MS = float(
+    os.environ.get("KITE_PROFILE_SAMPLE_INTERVAL_MS", 10))
+# Defaults to the directory of `KITE_LOG_FILE_PATH`
+PROFILE_DIR = os.environ.get("KITE_PROFILE_DIR")
+
+PROFILERS = ("cprofile", "tracemalloc", "sample")
+
+
+def parse_probability(strn: str) -> float:
+    splat = strn.split('/')
+    if len(splat) == 2:
+        numer, denom = splat
+        return float(numer) / float(denom)
+    elif len(splat) == 1:
+        return float(splat[0])
+    raise ValueError(f"Cannot parse probabilty str of '{strn}'")
+
+
+def parse_profilers(strn: str) -> Set[str]:
+    profilers = {x.strip().lower() for x in strn.split(",") if x.strip()}
+    unknown = profilers - set(PROFILERS)
+    if unknown:
+        raise ValueError(f"Unknown profilers: {sorted(unknown)}")
+    return profilers
+
+
+def get_profile_dir() -> str:
+    if PROFILE_DIR:
+        return PROFILE_DIR
+    log_file_path = os.environ.get("KITE_LOG_FILE_PATH")
+    if log_file_path:
+        return os.path.dirname(log_file_path)
+    return tempfile.gettempdir()
+
+
+def format_frame(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    '''
+    A low overhead sampling profiler: a background thread records the stack of every other
+    thread each `interval_secs`, and the counts are written in the "collapsed stack" format
+    understood by flamegraph.pl/speedscope (`thread;outer;...;inner count` per line).
+    '''
+
+    def __init__(self, interval_secs: float):
+        self.interval_secs = interval_secs
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="kiteink-sampler", daemon=True)
+
+    def _sample(self):
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self._thread.ident:
+                continue
+            stack = []
+            f: Optional[FrameType] = frame
+            while f is not None:
+                stack.append(format_frame(f))
+                f = f.f_back
+            stack.append(thread_names.get(thread_id, str(thread_id)))
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stopped.wait(self.interval_secs):
+            self._sample()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def write_collapsed(self, filepath: str):
+        with open(filepath, 'w') as fp:
+            for stack, count in self.stacks.most_common():
+                fp.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def _cprofile(path_prefix: str) -> Iterator[None]:
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(f"{path_prefix}.pstats")
+        logging.info(f"Wrote cProfile stats to {path_prefix}.pstats")
+
+
+@contextmanager
+def _tracemalloc(path_prefix: str, limit: int = 50) -> Iterator[None]:
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(f"{path_prefix}.tracemalloc.txt", 'w') as fp:
+            fp.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n")
+            for stat in snapshot.statistics('lineno')[:limit]:
+                fp.write(f"{stat}\n")
+        logging.info(
+            f"Wrote tracemalloc stats to {path_prefix}.tracemalloc.txt")
+
+
+@contextmanager
+def _sample(path_prefix: str, interval_secs: float) -> Iterator[None]:
+    sampler = StackSampler(interval_secs)
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        sampler.write_collapsed(f"{path_prefix}.collapsed")
+        logging.info(f"Wrote sampled stacks to {path_prefix}.collapsed")
+
+
+@contextmanager
+def profiled(name: str, profilers: Set[str], profile_dir: str,
+             sample_interval_secs: float = PROFILE_SAMPLE_INTERVAL_MS / 1000) -> Iterator[None]:
+    '''
+    Run the body under each of `profilers`, writing results to files named like
+    `<profile_dir>/<name>-<timestamp>-<pid>.pstats`
+    '''
+    os.makedirs(profile_dir, exist_ok=True)
+    path_prefix = os.path.join(
+        profile_dir, f"{name}-{datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}")
+
+    with ExitStack() as stack:
+        if "tracemalloc" in profilers:
+            stack.enter_context(_tracemalloc(path_prefix))
+        if "sample" in profilers:
+            stack.enter_context(_sample(path_prefix, sample_interval_secs))
+        # Entered last so it profiles as little of the other profilers as possible
+        if "cprofile" in profilers:
+            stack.enter_context(_cprofile(path_prefix))
+        yield
+
+
+@contextmanager
+def profile_from_env(name: str) -> Iterator[None]:
+    '''
+    Profile the body if `KITE_PROFILE` is set (and this run wins the `KITE_PROFILE_PROBABILITY`
+    draw). The draw is passed on to child processes, so a cron cycle is profiled all or nothing.
+    '''
+    try:
+        profilers = parse_profilers(PROFILE)
+        probability = parse_probability(PROFILE_PROBABILITY)
+    except ValueError as err:
+        logging.warning(f"Ignoring profiling config: {err}")
+        profilers = set()
+
+    if not profilers or probability <= randfloat():
+        os.environ["KITE_PROFILE"] = ""
+        yield
+        return
+
+    os.environ["KITE_PROFILE_PROBABILITY"] = "1"
+    logging.info(f"Profiling {name} with {sorted(profilers)}")
+    with profiled(name, profilers, get_profile_dir()):
+        yield
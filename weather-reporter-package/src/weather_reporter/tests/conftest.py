@@ -0,0 +1,74 @@
+import json
+import os
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional
+
+import pytest
+
+from weather_reporter import painter
+from weather_reporter.glyph_atlas import GlyphAtlasStore
+from weather_reporter.painter import normalize_spot_data
+
+SPOT_DATA_PATH = os.path.join(os.path.dirname(__file__), "lanikai_data_1.json")
+
+
+@pytest.fixture(autouse=True)
+def glyph_atlas_store(tmp_path, monkeypatch) -> GlyphAtlasStore:
+    '''
+    Paint with a glyph atlas of the test's own, rather than one shared between runs
+    (by default, in the system temp dir)
+    '''
+    store = GlyphAtlasStore(str(tmp_path / "glyph-atlas.json"))
+    monkeypatch.setattr(painter, "get_glyph_atlas_store", lambda: store)
+    return store
+
+
+@pytest.fixture
+def raw_spot_data() -> dict:
+    '''
+    A spot fetched from Weatherflow (Lanikai, with a quicklook forecast), as output by `fetch_spots_json.py`
+    '''
+    with open(SPOT_DATA_PATH) as fp:
+        return json.load(fp)
+
+
+@pytest.fixture
+def spot_data(raw_spot_data) -> dict:
+    return normalize_spot_data(raw_spot_data)
+
+
+def build_spot_data(spot_id: int, forecasts: Optional[Dict[str, Dict[float, float]]] = None,
+                    obs_times: Iterable[float] = (), fetched_at: Optional[float] = None) -> dict:
+    '''
+    Minimal (normalized) spot data: observations at `obs_times` and, per model, a
+    forecast of {epoch secs: speed}. Speeds are in knots
+    '''
+    obs_times = list(obs_times)
+    return {
+        "graph_summary": {
+            "name": f"Spot {spot_id}",
+            "current_time_epoch_utc": fetched_at * 1000 if fetched_at is not None else None,
+            "wind_avg_data": [[t * 1000.0, 10.0 + (t // 300) % 5] for t in obs_times],
+            "wind_gust_data": [[t * 1000.0, 15.0] for t in obs_times],
+            "wind_dir_data": [[t * 1000.0, 68.0] for t in obs_times],
+        },
+        "models": {
+            model: {
+                "spot_id": spot_id,
+                "units_wind": "kts",
+                "model_data": [
+                    {
+                        "model_time_utc": datetime.fromtimestamp(t, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S%z"),
+                        "wind_speed": speed, "wind_gust": None, "wind_dir": 90,
+                    }
+                    for t, speed in sorted(forecast.items())
+                ],
+            }
+            for model, forecast in (forecasts or {}).items()
+        },
+    }
+
+
+@pytest.fixture
+def make_spot_data() -> Callable[..., dict]:
+    return build_spot_data
@@ -0,0 +1,105 @@
+import io
+import os
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+import pytest
+from PIL import Image
+
+from weather_reporter.backfill import (BackfillFrame, GifStreamWriter,
+                                       encode_gif_frame, plan_frames,
+                                       render_frame, render_frames)
+from weather_reporter.bundle_archive import (archive_bundle, list_bundles,
+                                             prune_bundles)
+from weather_reporter.painter import normalize_spot_data, paint_blk_and_red_imgs
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+def test_archive_round_trip(tmp_path, raw_spot_data):
+    fetched_ats = [datetime(2022, 2, 10, h, tzinfo=timezone.utc) for h in (12, 10, 11)]
+    for fetched_at in fetched_ats:
+        archive_bundle(str(tmp_path), [raw_spot_data], fetched_at=fetched_at)
+    (tmp_path / "unrelated.txt").write_text("")
+
+    bundles = list_bundles(str(tmp_path))
+    assert [t for t, _ in bundles] == sorted(dt.timestamp() for dt in fetched_ats)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_archive_is_pruned(tmp_path, raw_spot_data):
+    day = timedelta(days=1)
+    first = datetime(2022, 2, 1, tzinfo=timezone.utc)
+    for i in range(5):
+        archive_bundle(str(tmp_path), [raw_spot_data], fetched_at=first + i * day, max_age_secs=2.5 * DAY)
+    assert [t for t, _ in list_bundles(str(tmp_path))] == [(first + i * day).timestamp() for i in (2, 3, 4)]
+
+    [(_, newest)] = list_bundles(str(tmp_path))[-1:]
+    bundle_size = os.path.getsize(newest)
+    removed = prune_bundles(str(tmp_path), max_bytes=int(bundle_size * 1.5))
+    assert len(removed) == 2
+    assert list_bundles(str(tmp_path)) == [((first + 4 * day).timestamp(), newest)]
+
+    # Never removes the newest, however small the cap
+    assert prune_bundles(str(tmp_path), max_bytes=0) == []
+
+
+def test_plan_frames():
+    bundles = [(0, "a"), (HOUR, "b"), (5 * HOUR, "c")]
+    frames = list(plan_frames(bundles, start=-HOUR, end=6 * HOUR, cycle_secs=HOUR,
+                              max_bundle_age_secs=2 * HOUR))
+
+    # Nothing fetched before 0, and "b" is stale by 4h
+    assert [(f.render_at, f.bundle_path, f.shown) for f in frames] == [
+        (0, "a", 0),
+        (HOUR, "b", 0),
+        (2 * HOUR, "b", 1),
+        (3 * HOUR, "b", 2),
+        (5 * HOUR, "c", 0),
+    ]
+    assert [f.index for f in frames] == list(range(len(frames)))
+
+
+def test_render_time_is_injectable(raw_spot_data):
+    spots_data = [normalize_spot_data(raw_spot_data)]
+    now = datetime(2022, 2, 11, 15, 40, tzinfo=timezone.utc)
+    imgs = [paint_blk_and_red_imgs(spots_data, now=now) for _ in range(2)]
+    assert [img.tobytes() for img in imgs[0]] == [img.tobytes() for img in imgs[1]]
+
+    with pytest.raises(RuntimeError):
+        paint_blk_and_red_imgs(spots_data, now=datetime(2022, 2, 11, 15, 40))
+
+
+def test_streams_gif(tmp_path, raw_spot_data):
+    fetched_at = datetime(2022, 2, 11, 15, tzinfo=timezone.utc)
+    archive_bundle(str(tmp_path), [raw_spot_data], fetched_at=fetched_at)
+    frames = list(plan_frames(list_bundles(str(tmp_path)), fetched_at.timestamp(),
+                              fetched_at.timestamp() + 3 * HOUR, cycle_secs=HOUR))
+    assert len(frames) == 3
+
+    fp = io.BytesIO()
+    fp.close = lambda: None  # Keep the buffer readable after the writer closes it
+    writer = GifStreamWriter(fp)
+    for blocks in render_frames(frames, partial(encode_gif_frame, duration_ms=50), processes=1):
+        writer.write_frame(blocks)
+    writer.close()
+
+    fp.seek(0)
+    gif = Image.open(fp)
+    assert gif.n_frames == 3
+    assert gif.info["loop"] == 0
+    assert gif.info["duration"] == 50
+    # Frames decode to what was rendered
+    gif.seek(1)
+    expected = render_frame(frames[1])
+    assert gif.convert("RGB").tobytes() == expected.convert("RGB").tobytes()
+
+
+def test_frame_uses_palette(tmp_path, raw_spot_data):
+    archive_bundle(str(tmp_path), [raw_spot_data],
+                   fetched_at=datetime(2022, 2, 11, 15, tzinfo=timezone.utc))
+    [(fetched_at, path)] = list_bundles(str(tmp_path))
+    img = render_frame(BackfillFrame(index=0, render_at=fetched_at, bundle_path=path, shown=0))
+    assert img.mode == "P"
+    assert set(c for _, c in img.getcolors()) <= {0, 1, 2}
@@ -0,0 +1,143 @@
+import os
+import shutil
+from datetime import datetime, timezone
+
+import pytest
+
+from weather_reporter import column_archive
+from weather_reporter.column_archive import (Column, ColumnArchive,
+                                             compare_forecast_to_observed)
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+T0 = int(datetime(2022, 2, 10, tzinfo=timezone.utc).timestamp())
+
+
+def test_column_round_trip():
+    values = [T0, T0 + 300, T0 + 300, T0 - 5]
+    assert Column("t", 'q', delta=True).decode(Column("t", 'q', delta=True).encode(values)) == values
+
+    speeds = [0, 12.3, None, 0.1, 3276.7]
+    column = Column("s", 'h', scale=10)
+    assert column.decode(column.encode(speeds)) == speeds
+
+
+def test_appends_fetched_data(tmp_path, raw_spot_data):
+    spot_data = raw_spot_data
+    archive = ColumnArchive(str(tmp_path))
+    fetched_at = spot_data["graph_summary"]["current_time_epoch_utc"] / 1000
+
+    model_data = list(spot_data["models"].values())[0]["model_data"]
+    obs_times = {int(ms // 1000) for ms, avg in spot_data["graph_summary"]["wind_avg_data"] if avg is not None}
+    assert archive.append_cycle([spot_data], fetched_at=fetched_at) == {
+        "obs": len(obs_times), "forecast": len(model_data)}
+
+    # Refetching the same data appends nothing, even from a fresh instance
+    assert ColumnArchive(str(tmp_path)).append_cycle([spot_data], fetched_at=fetched_at + 1200) == {
+        "obs": 0, "forecast": 0}
+
+    obs = archive.scan("obs", 187573, 0, fetched_at + DAY)
+    assert obs["time"] == sorted(obs_times)
+    assert obs["wind_avg"][:2] == [round(v, 1) for _, v in spot_data["graph_summary"]["wind_avg_data"][:2]]
+
+    forecast = archive.scan("forecast", 187573, 0, fetched_at + 30 * DAY, ["wind_speed"])
+    assert forecast == {"wind_speed": [item["wind_speed"] for item in model_data]}
+
+
+def test_keeps_observations_after_null_padding(tmp_path, raw_spot_data):
+    spot_data = raw_spot_data
+    graph_summary = spot_data["graph_summary"]
+    fetched_at = graph_summary["current_time_epoch_utc"] / 1000
+    # Real payloads end with a null observation an hour from now
+    pad_ms, pad_avg = graph_summary["wind_avg_data"][-1]
+    assert pad_avg is None and pad_ms / 1000 > fetched_at + 50 * 60
+
+    archive = ColumnArchive(str(tmp_path))
+    archive.append_cycle([spot_data], fetched_at=fetched_at)
+
+    # The next fetch, 20 minutes later, has a new reading before the last one's pad
+    new_ms = fetched_at * 1000 + 10 * 60 * 1000
+    for key, value in (("wind_avg_data", 9.9), ("wind_gust_data", 12.0), ("wind_dir_data", 70.0)):
+        series = [point for point in graph_summary[key] if point[1] is not None]
+        graph_summary[key] = series + [[new_ms, value], [new_ms + 70 * 60 * 1000, None]]
+    assert archive.append_cycle([spot_data], fetched_at=fetched_at + 20 * 60)["obs"] == 1
+
+    obs = archive.scan("obs", 187573, fetched_at, fetched_at + DAY)
+    assert obs == {"time": [int(new_ms // 1000)], "wind_avg": [9.9], "wind_gust": [12.0], "wind_dir": [70]}
+    assert None not in archive.scan("obs", 187573, 0, fetched_at + DAY, ["wind_avg"])["wind_avg"]
+
+
+def test_appends_only_changed_forecast_hours(tmp_path, make_spot_data):
+    archive = ColumnArchive(str(tmp_path))
+    forecast = {T0 + h * HOUR: 10.0 for h in range(48)}
+    archive.append_cycle([make_spot_data(1, {"-1": forecast})], fetched_at=T0)
+
+    forecast[T0 + 30 * HOUR] = 20.0
+    assert archive.append_cycle([make_spot_data(1, {"-1": forecast})], fetched_at=T0 + 600)["forecast"] == 1
+
+    rows = archive.scan("forecast", 1, T0 + 30 * HOUR, T0 + 31 * HOUR)
+    assert list(zip(rows["fetched_at"], rows["wind_speed"])) == [(T0, 10.0), (T0 + 600, 20.0)]
+
+
+def test_compacts_finished_days(tmp_path, make_spot_data):
+    archive = ColumnArchive(str(tmp_path))
+    for i in range(6):
+        t = T0 + DAY - 3 * HOUR + i * HOUR
+        archive.append_cycle([make_spot_data(1, {"-1": {t + HOUR: float(i)}}, range(t - HOUR, t, 300))], fetched_at=t)
+    before = archive.scan("obs", 1, T0, T0 + 2 * DAY)
+
+    # Once fetching into the next day, the previous day is compacted
+    assert sorted(os.listdir(tmp_path / "obs" / "1"))[0] == "2022-02-10.col"
+    assert not any(f.startswith("2022-02-10.") and f != "2022-02-10.col" for f in os.listdir(tmp_path / "obs" / "1"))
+    assert archive.scan("obs", 1, T0, T0 + 2 * DAY) == before
+    assert len(before["time"]) == len(set(before["time"])) == 6 * 12
+
+
+def test_ignores_chunks_left_by_interrupted_compaction(tmp_path, make_spot_data):
+    archive = ColumnArchive(str(tmp_path))
+    archive.append_cycle([make_spot_data(1, {"-1": {}}, range(T0, T0 + HOUR, 300))], fetched_at=T0 + HOUR)
+    spot_dir = tmp_path / "obs" / "1"
+    [chunk] = os.listdir(spot_dir)
+    shutil.copy(spot_dir / chunk, tmp_path / chunk)
+    archive.append_cycle([make_spot_data(1, {"-1": {}}, range(T0 + DAY, T0 + DAY + HOUR, 300))], fetched_at=T0 + DAY + HOUR)
+
+    # As if compaction stopped before removing the chunks it merged
+    shutil.copy(tmp_path / chunk, spot_dir / chunk)
+    assert len(archive.scan("obs", 1, T0, T0 + 2 * DAY)["time"]) == 24
+
+
+def test_scan_reads_only_needed_partitions_and_columns(tmp_path, monkeypatch, make_spot_data):
+    archive = ColumnArchive(str(tmp_path))
+    for day in range(5):
+        t = T0 + day * DAY + 12 * HOUR
+        archive.append_cycle([make_spot_data(1, {"-1": {t + HOUR: 10.0}}, [t])], fetched_at=t + 1)
+
+    reads = []
+    read_chunk = column_archive.read_chunk
+
+    def spy(path, table, columns):
+        reads.append((os.path.basename(path), tuple(columns)))
+        return read_chunk(path, table, columns)
+
+    monkeypatch.setattr(column_archive, "read_chunk", spy)
+    rows = archive.scan("obs", 1, T0 + DAY, T0 + 3 * DAY, ["wind_avg"])
+    assert len(rows["wind_avg"]) == 2
+    assert reads == [("2022-02-11.col", ("time", "wind_avg")), ("2022-02-12.col", ("time", "wind_avg"))]
+
+    with pytest.raises(ValueError):
+        archive.scan("obs", 1, T0, T0 + DAY, ["nope"])
+
+
+def test_compare_forecast_to_observed(tmp_path, make_spot_data):
+    archive = ColumnArchive(str(tmp_path))
+    # Forecasts of 8 then 12 for hour 2, fetched 2h and 1h ahead
+    archive.append_cycle([make_spot_data(1, {"-1": {T0 + 2 * HOUR: 8.0}})], fetched_at=T0)
+    archive.append_cycle([make_spot_data(1, {"-1": {T0 + 2 * HOUR: 12.0}})], fetched_at=T0 + HOUR)
+    obs_times = range(T0 + 2 * HOUR, T0 + 3 * HOUR, 300)
+    archive.append_cycle([make_spot_data(1, {"-1": {}}, obs_times)], fetched_at=T0 + 3 * HOUR)
+    observed = sum(10.0 + (t // 300) % 5 for t in obs_times) / len(obs_times)
+
+    assert compare_forecast_to_observed(archive, 1, T0 + 2 * HOUR, T0 + 4 * HOUR) == [
+        (T0 + 2 * HOUR, observed, 12.0), (T0 + 3 * HOUR, None, None)]
+    assert compare_forecast_to_observed(archive, 1, T0 + 2 * HOUR, T0 + 3 * HOUR, lead_secs=90 * 60) == [
+        (T0 + 2 * HOUR, observed, 8.0)]
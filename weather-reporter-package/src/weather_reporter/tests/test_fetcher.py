@@ -1,2 +1,115 @@
 # curl https://api.weatherflow.com/wxengine/rest/graph/getGraph\?units_wind\=mph\&units_temp\=f\&units_distance\=mi\&fields\=wind\&format\=json\&null_ob_min_from_now\=60\&show_virtual_obs\=true\&spot_id\=187573\&time_start_offset_hours\=-36\&time_end_offset_hours\=0\&type\=dataonly\&model_ids\=-101\&wf_token\=e5615b765be6c96e23cc17cba3373778\&_\=1644300565602
 # The above generated test_resp_spot_...json
+
+import time
+from base64 import b64decode
+from io import BytesIO
+
+import pytest
+import requests
+from PIL import Image
+
+from weather_reporter.fetch_load import get_percentile, run_fetch_load
+from weather_reporter.fetcher import fetch_spots_data
+from weather_reporter.painter import normalize_spot_data, paint_blk_and_red_imgs
+from weather_reporter.weatherflow_api import (WeatherflowApi, WeatherFlowModel,
+                                              WeatherflowApiFailure,
+                                              WeatherflowApiWithWfTokenCache)
+from weather_reporter import wf_simulator
+from weather_reporter.wf_simulator import (OB_INTERVAL_SECS, SimulatorConfig,
+                                          WeatherflowSimulator)
+
+FAST = dict(latency_ms=1, jitter_ms=1, login_latency_ms=1, seed=0)
+
+
+def make_wfapi(sim: WeatherflowSimulator, tmp_path, **kwargs) -> WeatherflowApiWithWfTokenCache:
+    return WeatherflowApiWithWfTokenCache(
+        cache_file_path=str(tmp_path / "wftoken.txt"),
+        api_url=sim.url, login_url=sim.url, anonymous_url=sim.url, **kwargs)
+
+
+def test_fetches_from_simulator(tmp_path):
+    with WeatherflowSimulator(SimulatorConfig(**FAST)) as sim:
+        wfapi = make_wfapi(sim, tmp_path, username="u", password="p", expect_upgraded=True)
+        spots_data = fetch_spots_data(wfapi, [429, 187573], WeatherFlowModel.quicklook, threaded=True)
+
+    assert [d["graph_summary"]["name"] for d in spots_data] == ["Spot 429", "Spot 187573"]
+    assert Image.open(BytesIO(b64decode(spots_data[0]["gauge_img"]))).size == (180, 180)
+    # Paints like real data
+    paint_blk_and_red_imgs([normalize_spot_data(d) for d in spots_data])
+    assert sim.stats["logins"] == 1
+
+
+def test_graph_ends_with_null_observation(tmp_path):
+    with WeatherflowSimulator(SimulatorConfig(**FAST)) as sim:
+        graph_summary = make_wfapi(sim, tmp_path).fetch_graph_summary("429")
+
+    # Like Weatherflow's, for the `null_ob_min_from_now=60` which we ask for
+    now_ms = graph_summary["current_time_epoch_utc"]
+    for key in ("wind_avg_data", "wind_gust_data", "wind_dir_data"):
+        assert graph_summary[key][-1] == [now_ms + 60 * 60 * 1000, None]
+        assert graph_summary[key][-2][1] is not None
+
+
+def test_simulator_keeps_only_current_payloads(monkeypatch):
+    sim = WeatherflowSimulator(SimulatorConfig(**FAST))
+    try:
+        token = sim.issue_token(upgraded=False)
+        for t in range(0, 3 * OB_INTERVAL_SECS, OB_INTERVAL_SECS // 2):
+            monkeypatch.setattr(wf_simulator.time, "time", lambda: 1644500000.0 + t)
+            for spot_id in ("1", "2"):
+                first = sim.get_payload("getGraph", {"wf_token": token, "spot_id": spot_id})
+                assert sim.get_payload("getGraph", {"wf_token": token, "spot_id": spot_id}) is first
+            assert len(sim._payloads) == 2
+    finally:
+        sim.server.server_close()
+
+
+def test_anonymous_data_is_not_upgraded(tmp_path):
+    with WeatherflowSimulator(SimulatorConfig(**FAST)) as sim:
+        wfapi = make_wfapi(sim, tmp_path)
+        assert wfapi.fetch_graph_summary("429")["upgrade_available"]
+
+        # As if a login had silently failed
+        wfapi = WeatherflowApi(wf_token=sim.issue_token(upgraded=False), expect_upgraded=True,
+                               api_url=sim.url)
+        with pytest.raises(WeatherflowApiFailure):
+            wfapi.fetch_graph_summary("429")
+
+
+def test_refreshes_expired_token(tmp_path):
+    with WeatherflowSimulator(SimulatorConfig(token_ttl_secs=0.2, **FAST)) as sim:
+        wfapi = make_wfapi(sim, tmp_path, username="u", password="p", expect_upgraded=True)
+        first_token = wfapi.wf_token
+        time.sleep(0.3)
+        wfapi.fetch_model("429", WeatherFlowModel.quicklook)
+
+    assert wfapi.wf_token != first_token
+    assert (tmp_path / "wftoken.txt").read_text() == wfapi.wf_token
+    assert sim.stats["rejected_tokens"] == 1
+    assert sim.stats["logins"] == 2
+
+
+def test_http_errors_are_raised(tmp_path):
+    with WeatherflowSimulator(SimulatorConfig(error_rate=1, **FAST)) as sim:
+        wfapi = make_wfapi(sim, tmp_path)
+        with pytest.raises(requests.HTTPError):
+            wfapi.fetch_graph_summary("429")
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert [get_percentile(values, p) for p in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert get_percentile([7], 99) == 7
+
+
+def test_load_report():
+    with WeatherflowSimulator(SimulatorConfig(**FAST)) as sim:
+        report = run_fetch_load([1, 2], devices=3, cycles=2, model_id=WeatherFlowModel.quicklook,
+                                threaded=True, username="u", password="p",
+                                api_url=sim.url, login_url=sim.url, anonymous_url=sim.url)
+
+    assert report.cycles_ok == 6
+    assert len(report.recorder.latencies["getGraph"]) == 12
+    assert not report.recorder.failures
+    assert "p99" in report.format()
@@ -0,0 +1,45 @@
+import string
+
+import pytest
+from PIL import Image, ImageDraw
+
+from weather_reporter.glyph_atlas import GlyphAtlasStore
+from weather_reporter.painter import get_font_path
+
+LABELS = [
+    "Now", "Today", "7 Day", "Feb 10", "2/3", "Lanikai Beach", "12:30pm",
+    "Updated 02-10 15:39", "kts", "<3", "W 15.2", "88%",
+] + [c + d for c in string.printable.strip() for d in "0aMy.}"]
+
+
+def render(draw_text, text: str) -> Image.Image:
+    img = Image.new("1", (1000, 80), 1)
+    draw_text(img, (7, 11), text)
+    return img
+
+
+@pytest.mark.parametrize("size", [13, 20, 30, 40])
+def test_atlas_matches_freetype(size):
+    atlas = GlyphAtlasStore(path=None).get_atlas(get_font_path(), size)
+
+    def draw_atlas(img, coords, text):
+        atlas.draw_text(img, coords, text, fill=0)
+
+    def draw_freetype(img, coords, text):
+        ImageDraw.Draw(img).text(coords, text, font=atlas.font, fill=0)
+
+    for text in LABELS:
+        assert render(draw_atlas, text).tobytes() == render(draw_freetype, text).tobytes(), text
+
+
+def test_atlas_persists(tmp_path):
+    path = str(tmp_path / "atlas.json")
+    store = GlyphAtlasStore(path)
+    store.get_atlas(get_font_path(), 20).get_text_mask("Today")
+    store.save()
+
+    atlas = GlyphAtlasStore(path).get_atlas(get_font_path(), 20)
+    assert set("Today") <= set(atlas.glyphs)
+    mask, _, _ = atlas.get_text_mask("Today")
+    assert mask is not None
+    assert not atlas.dirty
@@ -0,0 +1,62 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+from PIL import Image
+
+from weather_reporter import painter
+from weather_reporter.glyph_atlas import GlyphAtlasStore
+from weather_reporter.painter import get_painter_config, paint_blk_and_red_imgs
+
+TESTS_DIR = os.path.dirname(__file__)
+GOLDEN_PATHS = {
+    "blk": os.path.join(TESTS_DIR, "golden_lanikai_data_1_blk.png"),
+    "red": os.path.join(TESTS_DIR, "golden_lanikai_data_1_red.png"),
+}
+
+# Shortly after the fixture was fetched (15:13 HST), so it is not painted as stale
+NOW = datetime(2022, 2, 11, 1, 20, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def spots_data(spot_data) -> list:
+    return [spot_data]
+
+
+def paint_planes(spots_data: list, glyph_atlas: bool, monkeypatch) -> dict:
+    monkeypatch.setenv("KITE_GLYPH_ATLAS", "1" if glyph_atlas else "0")
+    # Low enough that some bars are highlighted on the red plane
+    monkeypatch.setenv("HIGHLIGHT_THRESHOLD_SPEED_KNOTS", "12")
+    get_painter_config.cache_clear()
+    try:
+        blk, red = paint_blk_and_red_imgs(spots_data, page_label="1/2", now=NOW)
+    finally:
+        get_painter_config.cache_clear()
+    return {"blk": blk, "red": red}
+
+
+@pytest.mark.parametrize("text_from", ["atlas", "saved_atlas", "freetype"])
+def test_paints_golden_frame(spots_data, text_from, glyph_atlas_store, monkeypatch):
+    '''
+    Regenerate the golden images (after an intended change to the layout) with
+    `KITE_UPDATE_GOLDEN=1 pytest tests/test_golden_image.py`, and look them over
+    '''
+    if text_from == "saved_atlas":
+        # As on a later run, with every glyph loaded from the atlas the first run saved
+        paint_planes(spots_data, True, monkeypatch)
+        assert os.path.exists(glyph_atlas_store.path)
+        saved_store = GlyphAtlasStore(glyph_atlas_store.path)
+        monkeypatch.setattr(painter, "get_glyph_atlas_store", lambda: saved_store)
+
+    planes = paint_planes(spots_data, text_from != "freetype", monkeypatch)
+    if text_from == "freetype":
+        assert not os.path.exists(glyph_atlas_store.path)
+    if os.environ.get("KITE_UPDATE_GOLDEN") and text_from == "atlas":
+        for name, img in planes.items():
+            img.save(GOLDEN_PATHS[name])
+
+    for name, img in planes.items():
+        with Image.open(GOLDEN_PATHS[name]) as golden:
+            golden = golden.convert("1")
+            assert img.mode == "1" and img.size == golden.size, name
+            assert img.tobytes() == golden.tobytes(), f"{name} plane differs from {GOLDEN_PATHS[name]}"
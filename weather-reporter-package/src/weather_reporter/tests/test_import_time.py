@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+from typing import Dict, Sequence, Tuple
+
+import pytest
+
+# Take the best of this many runs. A busy machine is slow in bursts, which can last a few runs
+BEST_OF_RUNS = 7
+
+# Wall-clock budgets depend on the machine (and how busy it is), so they're only checked
+# when set, e.g., `KITE_IMPORT_TIME_BUDGET_US=60000 KITE_CLI_IMPORT_TIME_BUDGET_US=80000` on
+# a dev machine, where the painter import measured 31-36ms and the CLI's imports 42-49ms.
+
+# Cumulative microseconds allowed to `import weather_reporter.painter` (as reported by `-X importtime`)
+IMPORT_TIME_BUDGET_US = os.environ.get("KITE_IMPORT_TIME_BUDGET_US")
+
+# Microseconds allowed to everything `paint_report_from_json.py` imports, after the interpreter's
+# own startup. PIL.Image, dataclasses (via inspect) and logging.handlers are most of it
+CLI_IMPORT_TIME_BUDGET_US = os.environ.get("KITE_CLI_IMPORT_TIME_BUDGET_US")
+
+CLI_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'bin', 'paint_report_from_json.py')
+
+# Optional dependencies which must only be loaded when they're actually used
+LAZY_MODULES = ('qrcode', 'dateutil', 'pytz', 'waveshare_epd')
+
+
+def run_importtime(args: Sequence[str]) -> Dict[str, Tuple[int, bool]]:
+    '''
+    Returns a mapping of every module imported by `python -X importtime *args` to
+    its cumulative import time in microseconds, and whether it was a top-level import
+    '''
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', *args],
+        capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(cumulative), not name[1:].startswith(' '))
+    return times
+
+
+def measure_import_times(module: str) -> Dict[str, int]:
+    '''
+    Returns a mapping of every imported module to its cumulative import time in microseconds
+    '''
+    return {name: cumulative for name, (cumulative, _) in run_importtime(['-c', f'import {module}']).items()}
+
+
+def measure_cli_import_time(startup_modules: Sequence[str]) -> int:
+    '''
+    Microseconds spent on the CLI's imports, i.e., top-level imports other than the
+    interpreter's startup ones
+    '''
+    times = run_importtime([CLI_PATH, '--help'])
+    return sum(cumulative for name, (cumulative, top_level) in times.items()
+               if top_level and name not in startup_modules)
+
+
+def get_lazy_modules(times: Dict) -> list:
+    return [name for name in times if name.split('.')[0] in LAZY_MODULES]
+
+
+def test_painter_import_skips_lazy_modules():
+    assert not get_lazy_modules(measure_import_times('weather_reporter.painter'))
+
+
+def test_cli_import_skips_lazy_modules():
+    assert not get_lazy_modules(run_importtime([CLI_PATH, '--help']))
+
+
+@pytest.mark.skipif(not IMPORT_TIME_BUDGET_US, reason="KITE_IMPORT_TIME_BUDGET_US is not set")
+def test_painter_import_within_budget():
+    budget = int(IMPORT_TIME_BUDGET_US)
+    best = min(
+        measure_import_times('weather_reporter.painter')['weather_reporter.painter']
+        for _ in range(BEST_OF_RUNS)
+    )
+    assert best <= budget, f"Import took {best}us (budget {budget}us)"
+
+
+@pytest.mark.skipif(not CLI_IMPORT_TIME_BUDGET_US, reason="KITE_CLI_IMPORT_TIME_BUDGET_US is not set")
+def test_cli_import_within_budget():
+    budget = int(CLI_IMPORT_TIME_BUDGET_US)
+    startup_modules = list(run_importtime(['-c', 'pass']))
+    best = min(measure_cli_import_time(startup_modules) for _ in range(BEST_OF_RUNS))
+    assert best <= budget, f"CLI imports took {best}us (budget {budget}us)"
@@ -0,0 +1,86 @@
+import gzip
+import logging
+import os
+
+import pytest
+
+from weather_reporter.log import (BatchingRotatingFileHandler,
+                                  parse_log_levels)
+
+
+def make_record(msg: str) -> logging.LogRecord:
+    return logging.LogRecord("test", logging.INFO, __file__, 0, msg, None, None)
+
+
+def test_parse_log_levels():
+    assert parse_log_levels("WARNING, urllib3=ERROR,weather_reporter.painter=debug") == {
+        "": logging.WARNING,
+        "urllib3": logging.ERROR,
+        "weather_reporter.painter": logging.DEBUG,
+    }
+    with pytest.raises(ValueError):
+        parse_log_levels("urllib3=LOUD")
+
+
+def test_handler_batches_writes(tmp_path):
+    log_path = str(tmp_path / "kiteink.log")
+    handler = BatchingRotatingFileHandler(log_path, batch_size=3)
+    handler.handle(make_record("one"))
+    handler.handle(make_record("two"))
+    assert not os.path.exists(log_path)
+
+    handler.handle(make_record("three"))
+    with open(log_path) as fp:
+        assert fp.read() == "one\ntwo\nthree\n"
+    handler.close()
+
+
+def test_handler_rotates_and_compresses_by_size(tmp_path):
+    log_path = str(tmp_path / "kiteink.log")
+    handler = BatchingRotatingFileHandler(
+        log_path, max_bytes=10, backup_count=2, batch_size=1)
+    for msg in ("first", "second", "third", "fourth"):
+        handler.handle(make_record(msg))
+    handler.close()
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "kiteink.log", "kiteink.log.1.gz", "kiteink.log.2.gz", "kiteink.log.lock"]
+    with gzip.open(log_path + ".1.gz", "rt") as fp:
+        assert fp.read() == "third\n"
+
+
+def test_handler_rotates_by_age(tmp_path):
+    log_path = tmp_path / "kiteink.log"
+    log_path.write_text("yesterday\n")
+    os.utime(log_path, (0, 0))
+
+    handler = BatchingRotatingFileHandler(
+        str(log_path), max_age_secs=60 * 60, batch_size=1)
+    handler.handle(make_record("today"))
+    handler.close()
+
+    assert log_path.read_text() == "today\n"
+    with gzip.open(str(log_path) + ".1.gz", "rt") as fp:
+        assert fp.read() == "yesterday\n"
+
+
+def test_handlers_share_a_log(tmp_path):
+    # As if from two processes, e.g., cron's fetch and the display pipeline
+    log_path = str(tmp_path / "kiteink.log")
+    handlers = [BatchingRotatingFileHandler(log_path, max_bytes=30, backup_count=20, batch_size=1)
+                for _ in range(2)]
+    msgs = [f"message {i}" for i in range(20)]
+    for i, msg in enumerate(msgs):
+        handlers[i % 2].handle(make_record(msg))
+    for handler in handlers:
+        handler.close()
+
+    # Nothing is written to a file which another handler has rotated away
+    written = []
+    for i in reversed(range(1, 21)):
+        if os.path.exists(f"{log_path}.{i}.gz"):
+            with gzip.open(f"{log_path}.{i}.gz", "rt") as fp:
+                written += fp.read().splitlines()
+    with open(log_path) as fp:
+        written += fp.read().splitlines()
+    assert written == msgs
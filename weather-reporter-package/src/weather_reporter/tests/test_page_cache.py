@@ -0,0 +1,53 @@
+import copy
+import time
+
+from weather_reporter import page_cache
+from weather_reporter.page_cache import PageCache, update_page_cache
+from weather_reporter.painter import paginate_spots
+
+
+def test_paginate_spots():
+    assert paginate_spots(list(range(7)), 3) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_page_cache_rotates_then_needs_refresh(tmp_path, spot_data):
+    spots_data = [spot_data] * 5
+    cache = PageCache(str(tmp_path))
+    assert cache.needs_refresh()
+
+    update_page_cache(cache, spots_data)
+    assert cache.manifest.num_pages == 2
+
+    first_blk, _ = cache.next_page()
+    assert not cache.needs_refresh()
+
+    # A new process picks up the rotation where the last one left off
+    cache = PageCache(str(tmp_path))
+    second_blk, _ = cache.next_page()
+    assert list(first_blk.getdata()) != list(second_blk.getdata())
+    assert cache.needs_refresh()
+
+    # Refetching unchanged data still repaints, as the pages show when they were painted
+    update_page_cache(cache, spots_data)
+    assert not cache.needs_refresh()
+    assert cache.manifest.next_page == 0
+
+
+def test_unchanged_data_is_repainted(tmp_path, spot_data, monkeypatch):
+    painted = []
+    paint_pages = page_cache.paint_pages
+    monkeypatch.setattr(page_cache, "paint_pages", lambda *args, **kwargs: painted.append(1) or paint_pages(*args, **kwargs))
+
+    cache = PageCache(str(tmp_path), max_age_secs=60 * 60)
+    update_page_cache(cache, [spot_data])
+    fetched_at = cache.manifest.fetched_at
+    cache.next_page()
+
+    # An hour on, a station which stopped reporting returns identical data. It's repainted
+    # with the current time (and shown as old), and is only due a refresh an hour later
+    now = time.time() + 60 * 60 + 1
+    monkeypatch.setattr(time, "time", lambda: now)
+    assert cache.needs_refresh()
+    update_page_cache(cache, [copy.deepcopy(spot_data)])
+    assert len(painted) == 2
+    assert cache.manifest.fetched_at == now > fetched_at
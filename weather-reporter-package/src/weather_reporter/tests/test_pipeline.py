@@ -0,0 +1,111 @@
+import threading
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Optional
+
+import pytest
+from PIL import Image
+
+from weather_reporter.painter import TZ
+from weather_reporter.pipeline import (Frame, LatestFrameSlot, PipelinedRunner,
+                                       iter_refresh_slots, parse_hours)
+
+
+def make_test_frame(display_at: float, fetched_at: Optional[float] = None) -> Frame:
+    img = Image.new("1", (1, 1), 1)
+    return Frame(display_at=display_at, fetched_at=fetched_at or time.time(), blk_img=img, red_img=img)
+
+
+def test_slot_keeps_only_newest_frame():
+    slot = LatestFrameSlot()
+    slot.put(make_test_frame(1))
+    slot.put(make_test_frame(2))
+    assert slot.take(timeout=0).display_at == 2
+    assert slot.dropped == 1
+    assert slot.take(timeout=0) is None
+
+
+def test_slot_take_returns_none_once_closed():
+    slot = LatestFrameSlot()
+    slot.put(make_test_frame(1))
+    slot.close()
+    assert slot.take().display_at == 1
+    assert slot.take() is None
+
+
+def test_runner_fetches_next_frame_while_displaying():
+    now = time.time()
+    slots = [now, now + 0.1, now + 0.2]
+    made = []
+    displayed = []
+    overlapped = threading.Event()
+    displaying = threading.Event()
+
+    def make_frame(display_at: float) -> Frame:
+        if displaying.is_set():
+            overlapped.set()
+        made.append(display_at)
+        return make_test_frame(display_at)
+
+    def display_frame(frame: Frame):
+        displaying.set()
+        time.sleep(0.15)  # A slow epaper refresh
+        displaying.clear()
+        displayed.append(frame.display_at)
+
+    runner = PipelinedRunner(
+        make_frame=make_frame, display_frame=display_frame,
+        slots=iter(slots), prefetch_lead_secs=0.05)
+    runner.run()
+
+    assert made == slots
+    assert overlapped.is_set()
+    # Every displayed frame is the newest available at the time--never an older one after a newer one
+    assert displayed == sorted(displayed)
+    assert displayed[-1] == slots[-1]
+    assert runner.displayed + runner.frame_slot.dropped == len(slots)
+
+
+def test_runner_skips_stale_frames():
+    displayed = []
+    runner = PipelinedRunner(
+        make_frame=lambda display_at: make_test_frame(display_at, fetched_at=display_at - 100),
+        display_frame=displayed.append,
+        slots=iter([time.time()]),
+        max_frame_age_secs=10)
+    runner.run()
+    assert displayed == []
+    assert runner.frame_slot.dropped == 1
+
+
+def test_refresh_slots_use_painter_time_zone(monkeypatch):
+    # Whatever the host's time zone, active hours are in the display's
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    try:
+        start = datetime(2022, 2, 10, 0, 0, tzinfo=TZ).timestamp()
+        slots = list(islice(iter_refresh_slots(60 * 60, active_hours=(6, 9), start=start), 4))
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert [datetime.fromtimestamp(t, TZ).hour for t in slots] == [6, 7, 8, 6]
+
+
+def test_first_refresh_slot_is_right_away(monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1644500000.0)
+    slots = iter_refresh_slots(20 * 60, jitter_secs=120)
+    assert next(slots) == 1644500000.0
+    assert 1644500000.0 + 20 * 60 <= next(slots) <= 1644500000.0 + 22 * 60
+
+
+def test_hours_wrap_past_midnight():
+    assert parse_hours("6-22") == (6, 23)
+    assert parse_hours("0-23") == (0, 0)
+    assert parse_hours("22-5") == (22, 6)
+    with pytest.raises(ValueError):
+        parse_hours("6-24")
+
+    start = datetime(2022, 2, 10, 0, 0, tzinfo=TZ).timestamp()
+    slots = islice(iter_refresh_slots(60 * 60, active_hours=parse_hours("22-1"), start=start), 5)
+    assert [datetime.fromtimestamp(t, TZ).hour for t in slots] == [0, 1, 22, 23, 0]
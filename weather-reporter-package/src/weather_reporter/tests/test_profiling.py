@@ -0,0 +1,42 @@
+import os
+import pstats
+import time
+
+import pytest
+
+from weather_reporter.profiling import (parse_probability, parse_profilers,
+                                        profiled)
+
+
+def busy_wait(secs: float):
+    end = time.time() + secs
+    while time.time() < end:
+        sum(range(100))
+
+
+def test_parse_profilers():
+    assert parse_profilers(" cProfile,sample ") == {"cprofile", "sample"}
+    assert parse_profilers("") == set()
+    with pytest.raises(ValueError):
+        parse_profilers("perf")
+
+
+def test_parse_probability():
+    assert parse_probability("1/4") == 0.25
+    assert parse_probability("0.5") == 0.5
+
+
+def test_profiled_writes_results(tmp_path):
+    with profiled("test", {"cprofile", "tracemalloc", "sample"}, str(tmp_path), sample_interval_secs=0.001):
+        busy_wait(0.05)
+
+    files = {os.path.splitext(f)[1]: tmp_path / f for f in os.listdir(tmp_path)}
+    assert set(files) == {".pstats", ".collapsed", ".txt"}
+
+    stats = pstats.Stats(str(files[".pstats"]))
+    assert any(func[2] == "busy_wait" for func in stats.stats)  # type: ignore
+
+    collapsed = files[".collapsed"].read_text()
+    assert "test_profiling.py:busy_wait" in collapsed
+
+    assert files[".txt"].read_text().startswith("Peak traced memory")
@@ -0,0 +1,87 @@
+import random
+
+from weather_reporter.window_index import ForecastSeries, WindowIndex
+
+THRESHOLD_SPEEDS = {'kts': 10, 'mph': 11.5, 'kph': 18.5}
+
+HOUR = 60 * 60
+
+
+def test_series_finds_windows():
+    series = ForecastSeries(spot_id=1, model="m", spot_name="x", units_wind="kts", threshold=10)
+    series.update([0, HOUR, 2 * HOUR, 3 * HOUR, 4 * HOUR], [12, 5, 10, 15, 11])
+    assert [(w.start, w.end, w.peak, w.peak_at) for w in series.windows] == [
+        (0, HOUR, 12, 0),
+        (2 * HOUR, 5 * HOUR, 15, 3 * HOUR),
+    ]
+
+
+def test_series_updates_incrementally():
+    rand = random.Random(0)
+    series = ForecastSeries(spot_id=1, model="m", spot_name="x", units_wind="kts", threshold=10)
+    times = [i * HOUR for i in range(48)]
+    speeds = [rand.choice([0, 9, 10, 20]) for _ in times]
+    series.update(times, speeds)
+
+    for _ in range(200):
+        # Like a refetch: the past drops off, an hour is added, and some hours change
+        times = times[1:] + [times[-1] + HOUR]
+        speeds = speeds[1:] + [rand.choice([0, 20])]
+        for i in rand.sample(range(len(speeds)), 2):
+            speeds[i] = rand.choice([0, 9, 10, 20])
+        series.update(times, speeds)
+
+        rebuilt = ForecastSeries(spot_id=1, model="m", spot_name="x", units_wind="kts", threshold=10)
+        rebuilt.update(times, speeds)
+        assert series.windows == rebuilt.windows
+
+    # Unchanged data recomputes nothing
+    assert series.update(times, speeds) == []
+
+
+def test_index_next_window_and_persistence(tmp_path, spot_data):
+    path = str(tmp_path / "windows.json")
+    index = WindowIndex(path, threshold_speeds=THRESHOLD_SPEEDS)
+    assert index.update([spot_data]) == 1
+    index.save()
+
+    windows = index.windows()
+    assert windows and all(w.peak >= 10 for w in windows)
+    assert index.next_window(0) == windows[0]
+    # During a window it is the next session
+    assert index.next_window(windows[1].start + 1) == windows[1]
+    assert index.next_window(windows[-1].end) is None
+    assert index.next_window(0, spot_id=1) is None
+
+    index = WindowIndex(path, threshold_speeds=THRESHOLD_SPEEDS)
+    assert index.windows() == windows
+    assert index.update([spot_data]) == 0
+
+
+def test_index_drops_stale_series(tmp_path, make_spot_data):
+    path = str(tmp_path / "windows.json")
+    index = WindowIndex(path, threshold_speeds=THRESHOLD_SPEEDS)
+    forecast = {i * HOUR: 12 for i in range(1, 5)}
+    index.update([make_spot_data(1, {"a": forecast, "b": forecast}, fetched_at=0), make_spot_data(2, {"a": forecast}, fetched_at=0)])
+    assert sorted(index.series) == ["1:a", "1:b", "2:a"]
+    assert len(index.windows()) == 3
+
+    # Spot 1 is no longer forecast by model "b", and spot 2 (not refetched) is left alone
+    index.update([make_spot_data(1, {"a": forecast}, fetched_at=HOUR)])
+    assert sorted(index.series) == ["1:a", "2:a"]
+    assert [w.spot_id for w in index.windows()] == [1, 2]
+
+    # Once its last forecast hour has passed, spot 2 is dropped too
+    later = {i * HOUR: 12 for i in range(5, 8)}
+    index.update([make_spot_data(1, {"a": later}, fetched_at=5 * HOUR)])
+    assert sorted(index.series) == ["1:a"]
+    index.save()
+    assert sorted(WindowIndex(path, threshold_speeds=THRESHOLD_SPEEDS).series) == ["1:a"]
+
+
+def test_index_saves_into_new_directory(tmp_path, spot_data):
+    path = str(tmp_path / "not" / "yet" / "windows.json")
+    index = WindowIndex(path, threshold_speeds=THRESHOLD_SPEEDS)
+    index.update([spot_data])
+    index.save()
+    assert WindowIndex(path, threshold_speeds=THRESHOLD_SPEEDS).windows() == index.windows()
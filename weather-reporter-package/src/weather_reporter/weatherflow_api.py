@@ -3,6 +3,7 @@
 from enum import Enum
 import json
 import logging
+import os
 import time
 from dataclasses import dataclass
 from io import BytesIO
@@ -12,6 +13,11 @@ import requests
 
 DEFAULT_SPOT_ID = '187573'
 
+# Overridable, e.g., to point at a local `wf_simulator.py`
+WF_API_URL = os.environ.get("WF_API_URL", "https://api.weatherflow.com")
+WF_LOGIN_URL = os.environ.get("WF_LOGIN_URL", "https://secure.ikitesurf.com")
+WF_ANONYMOUS_URL = os.environ.get("WF_ANONYMOUS_URL", "https://wx.ikitesurf.com")
+
 BASE_HEADERS = {
     'upgrade-insecure-requests': '1',
     'Pragma': 'no-cache',
@@ -65,16 +71,17 @@ def parse_json_from_jquery_callback(jquery_callback: str, content: str) -> dict:
     return json.loads(content[start:-1])
 
 
-def make_logged_in_ikitesurf_session(username: str, password: str) -> requests.Session:
+def make_logged_in_ikitesurf_session(username: str, password: str,
+                                     login_url: str = WF_LOGIN_URL) -> requests.Session:
     sesh = requests.Session()
 
     resp = sesh.get(
-        "https://secure.ikitesurf.com/",
+        f"{login_url}/",
         headers=HTML_HEADERS
     )
 
     resp = sesh.post(
-        'https://secure.ikitesurf.com',
+        login_url,
         params={
             'app': 'wx',
             'rd': f'spot/{DEFAULT_SPOT_ID}'
@@ -93,11 +100,11 @@ def make_logged_in_ikitesurf_session(username: str, password: str) -> requests.S
     return sesh
 
 
-def make_anonymous_ikitesurf_session() -> requests.Session:
+def make_anonymous_ikitesurf_session(anonymous_url: str = WF_ANONYMOUS_URL) -> requests.Session:
     sesh = requests.Session()
 
     resp = sesh.get(
-        "https://wx.ikitesurf.com/",
+        f"{anonymous_url}/",
         headers=HTML_HEADERS
     )
     resp.raise_for_status()
@@ -128,6 +135,10 @@ class WeatherflowApi:
     units_temp: str = 'f'
     units_distance: str = 'mi'
 
+    api_url: str = WF_API_URL
+    login_url: str = WF_LOGIN_URL
+    anonymous_url: str = WF_ANONYMOUS_URL
+
     def __post_init__(self):
         if not self.wf_token:
             self.refresh_wf_token()
@@ -137,18 +148,18 @@ class WeatherflowApi:
             logging.info(
                 f"Logging in to Weatherflow API with username {self.username}")
             self.wf_token = get_wf_token(
-                make_logged_in_ikitesurf_session(self.username, self.password))
+                make_logged_in_ikitesurf_session(self.username, self.password, self.login_url))
 
         else:
             logging.info(
                 f"No login credentials found for Weatherflow API--using anonymous session")
             self.sesh = requests.Session()
             self.wf_token = get_wf_token(
-                make_anonymous_ikitesurf_session())
+                make_anonymous_ikitesurf_session(self.anonymous_url))
 
     def fetch_graph_summary(self, spot_id: str) -> dict:
         resp = requests.get(
-            'https://api.weatherflow.com/wxengine/rest/graph/getGraph',
+            f'{self.api_url}/wxengine/rest/graph/getGraph',
             params={
                 'units_wind': [self.units_wind],
                 'units_temp': [self.units_temp],
@@ -174,7 +185,7 @@ class WeatherflowApi:
 
     def fetch_model(self, spot_id: str, model_id: WeatherFlowModel) -> dict:
         resp = requests.get(
-            'https://api.weatherflow.com/wxengine/rest/model/getModelDataBySpot',
+            f'{self.api_url}/wxengine/rest/model/getModelDataBySpot',
             params={
                 'units_wind': [self.units_wind],
                 'units_temp': [self.units_temp],
@@ -194,7 +205,7 @@ class WeatherflowApi:
 
     def fetch_gauge_img(self, wind_speed: int, wind_dir: int, wind_dir_txt: str) -> BytesIO:
         resp = requests.get(
-            'https://api.weatherflow.com/wxengine/rest/graph/getGauge',
+            f'{self.api_url}/wxengine/rest/graph/getGauge',
             params={
                 'wf_token': [self.wf_token or ""],
                 'units_wind': [self.units_wind],
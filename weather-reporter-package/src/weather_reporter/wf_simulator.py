@@ -0,0 +1,428 @@
+import argparse
+import json
+import logging
+import math
+import secrets
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+from random import Random
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from zoneinfo import ZoneInfo
+
+from PIL import Image, ImageDraw, ImageFont
+
+SPOT_TZ_NAME = "Pacific/Honolulu"
+
+GAUGE_FONT_PATH = str(Path(__file__).resolve().parent / "fonts" / "pixellari.ttf")
+
+# Graph observations are this far apart, and payloads are regenerated this often
+OB_INTERVAL_SECS = 5 * 60
+GRAPH_HOURS = 36
+MODEL_HOURS = 181
+
+SPEED_FACTORS = {'kts': 1.0, 'mph': 1.15078, 'kph': 1.852}
+
+DIR_TXTS = ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+            "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"]
+
+SUCCESS_STATUS = {"status_code": 0, "status_message": "Success"}
+INVALID_TOKEN_STATUS = {"status_code": 2, "status_message": "Invalid wf_token"}
+
+
+@dataclass
+class SimulatorConfig:
+    latency_ms: float = 150
+    # Each response is delayed by `latency_ms` plus up to this much more, uniformly
+    jitter_ms: float = 100
+    # Fraction of API requests answered with an HTTP 503
+    error_rate: float = 0.0
+    # Fraction of getGraph/getModelDataBySpot requests rejected with a non-zero
+    # status code, like Weatherflow does for a bad wf_token
+    api_error_rate: float = 0.0
+    # wf_tokens stop working this long after they're issued
+    token_ttl_secs: Optional[float] = None
+    login_latency_ms: float = 500
+    seed: Optional[int] = None
+
+
+def add_simulator_args(parser: argparse.ArgumentParser):
+    parser.add_argument('--latency-ms', type=float, default=150)
+    parser.add_argument('--jitter-ms', type=float, default=100,
+                        help="Add up to this much latency more, uniformly")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Fraction of API requests answered with an HTTP 503")
+    parser.add_argument('--api-error-rate', type=float, default=0.0,
+                        help="Fraction of API requests rejected with a non-zero status code")
+    parser.add_argument('--token-ttl-secs', type=float, default=None,
+                        help="Expire wf_tokens this long after they're issued")
+    parser.add_argument('--login-latency-ms', type=float, default=500)
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def get_simulator_config(args: argparse.Namespace) -> SimulatorConfig:
+    return SimulatorConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        api_error_rate=args.api_error_rate, token_ttl_secs=args.token_ttl_secs,
+        login_latency_ms=args.login_latency_ms, seed=args.seed)
+
+
+def get_dir_txt(wind_dir: float) -> str:
+    return DIR_TXTS[int((wind_dir % 360) / 22.5 + 0.5) % 16]
+
+
+def get_wind(spot_id: int, t: float) -> Tuple[float, float, float]:
+    '''
+    Simulated (speed kts, gust kts, direction) at `t`: a daily cycle which differs
+    per spot, plus noise which is deterministic for a spot and time
+    '''
+    day_phase = 2 * math.pi * (t / 86400) + spot_id
+    noise = (hash((spot_id, int(t // OB_INTERVAL_SECS))) % 1000) / 1000 - 0.5
+    speed = max(0.0, 10 + spot_id % 7 + 7 * math.sin(day_phase) + 3 * noise)
+    gust = speed * 1.3 + 2 * abs(noise)
+    wind_dir = (70 + 25 * math.sin(day_phase / 3) + 20 * noise) % 360
+    return speed, gust, wind_dir
+
+
+def format_local(dt: datetime) -> str:
+    return dt.astimezone(ZoneInfo(SPOT_TZ_NAME)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def make_graph(spot_id: int, units_wind: str, upgraded: bool, now: float,
+               null_ob_min_from_now: Optional[int] = None) -> dict:
+    '''
+    A getGraph response shaped (and sized) like Weatherflow's, with the last
+    `GRAPH_HOURS` of observations--and, like Weatherflow's for `null_ob_min_from_now`,
+    a null observation that many minutes after `now`
+    '''
+    factor = SPEED_FACTORS.get(units_wind, 1.0)
+    last_ob = now - now % OB_INTERVAL_SECS
+    avgs, gusts, dirs = [], [], []
+    for t in range(int(last_ob - GRAPH_HOURS * 3600), int(last_ob) + 1, OB_INTERVAL_SECS):
+        speed, gust, wind_dir = get_wind(spot_id, t)
+        avgs.append([t * 1000.0, speed * factor])
+        gusts.append([t * 1000.0, gust * factor])
+        dirs.append([t * 1000.0, float(int(wind_dir))])
+    if null_ob_min_from_now is not None:
+        for series in (avgs, gusts, dirs):
+            series.append([(now + null_ob_min_from_now * 60) * 1000.0, None])
+
+    speed, gust, wind_dir = get_wind(spot_id, last_ob)
+    now_dt = datetime.fromtimestamp(now, tz=timezone.utc)
+    return {
+        "air_temp_data": None,
+        "current_time_epoch_utc": int(now * 1000),
+        "current_time_local": format_local(now_dt),
+        "graph_data_exists": True,
+        "is_data_high_resolution": False,
+        "is_data_restricted": False,
+        "is_data_super_high_resolution": False,
+        "is_data_thinned": False,
+        "last_ob_avg": speed * factor,
+        "last_ob_dir": int(wind_dir),
+        "last_ob_dir_txt": get_dir_txt(wind_dir),
+        "last_ob_gust": gust * factor,
+        "last_ob_lull": None,
+        "last_ob_pres": None,
+        "last_ob_temp": 78.0,
+        "last_ob_time_local": format_local(datetime.fromtimestamp(last_ob, tz=timezone.utc)) + ".0",
+        "last_ob_wind_desc": f"{round(speed * factor)} (g{round(gust * factor)}) {units_wind} {get_dir_txt(wind_dir)}",
+        "local_timezone": SPOT_TZ_NAME,
+        "model_data": None,
+        "name": f"Spot {spot_id}",
+        "nws_wind_dir": None,
+        "nws_wind_high": None,
+        "nws_wind_low": None,
+        "pressure_data": None,
+        "provider": 102,
+        "status": SUCCESS_STATUS,
+        "tz_offset": int(ZoneInfo(SPOT_TZ_NAME).utcoffset(now_dt.replace(tzinfo=None)).total_seconds() // 3600),
+        "units_temp": "F",
+        "units_wind": units_wind,
+        "upgrade_available": not upgraded,
+        "water_level_data": None,
+        "water_temp_data": None,
+        "wave_height_data": None,
+        "website_id": 2,
+        "wind_avg_data": avgs,
+        "wind_dir_data": dirs,
+        "wind_gust_data": gusts,
+        "wind_lull_data": None,
+        "yaxis_max": None,
+        "yaxis_min": None,
+    }
+
+
+def make_model(spot_id: int, model_id: int, units_wind: str, upgraded: bool, now: float) -> dict:
+    '''
+    A getModelDataBySpot response shaped (and sized) like Weatherflow's, with
+    `MODEL_HOURS` hourly forecasts from the latest 6-hourly model run
+    '''
+    factor = SPEED_FACTORS.get(units_wind, 1.0)
+    tz = ZoneInfo(SPOT_TZ_NAME)
+    now_dt = datetime.fromtimestamp(now, tz=timezone.utc)
+    first = now_dt.replace(minute=0, second=0, microsecond=0)
+    run_time = first.replace(hour=first.hour - first.hour % 6) - timedelta(hours=6)
+
+    items = []
+    for i in range(MODEL_HOURS):
+        at = first + timedelta(hours=i)
+        speed, gust, wind_dir = get_wind(spot_id, at.timestamp())
+        items.append({
+            "cloud_cover": 0.5,
+            "easting": -17556878.168290786,
+            "is_short_premium": False,
+            "is_upgrade_available": not upgraded,
+            "lat": 21.39283,
+            "lon": -157.71612,
+            "max_wind_speed": speed * factor,
+            "max_wind_speed_distance": 0.0,
+            "model_id": model_id,
+            "model_run_id": int(run_time.timestamp()) // 3600,
+            "model_run_name": f"{run_time.hour:02d}z",
+            "model_run_time_utc": run_time.strftime("%Y-%m-%d %H:%M:%S%z"),
+            "model_time_local": at.astimezone(tz).strftime("%Y-%m-%d %H:%M:%S%z"),
+            "model_time_utc": at.strftime("%Y-%m-%d %H:%M:%S%z"),
+            "northing": 2438781.483423289,
+            "power_production": 0.0,
+            "precip_type": "none",
+            "pres": 1016.6,
+            "pressure_at_height": 1005.4757888403849,
+            "relative_humidity": 70.1,
+            "temp": 75.0,
+            "total_precip": 0.0,
+            "wind_dir": int(wind_dir),
+            "wind_dir_txt": get_dir_txt(wind_dir),
+            "wind_gust": gust * factor,
+            "wind_speed": speed * factor,
+        })
+
+    peak = max(items, key=lambda item: item["wind_speed"])
+    return {
+        "graphDataExists": False,
+        "is_premium": upgraded,
+        "is_upgrade_available": not upgraded,
+        "max_wind": peak["wind_speed"],
+        "max_wind_dir_txt": peak["wind_dir_txt"],
+        "max_wind_time_local": peak["model_time_utc"],
+        "model_color": "bbbbbb",
+        "model_data": items,
+        "model_name": "Simulated",
+        "spot_id": spot_id,
+        "status": SUCCESS_STATUS,
+        "tz_name": SPOT_TZ_NAME,
+        "units_distance": "mi",
+        "units_temp": "f",
+        "units_wind": units_wind,
+    }
+
+
+@lru_cache(maxsize=1024)
+def make_gauge_png(wind_speed: str, wind_dir: int, wind_dir_txt: str, size: int = 180) -> bytes:
+    '''
+    A getGauge image: a dial with an arrow from the wind direction
+    '''
+    img = Image.new("RGBA", (size, size), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(img)
+    center, radius = size / 2, size / 2 - 20
+    draw.ellipse((center - radius, center - radius, center + radius, center + radius),
+                 fill=(0xec, 0xec, 0xec, 255), outline=(0, 0, 0, 255), width=2)
+    for tick in range(0, 360, 10):
+        rad = math.radians(tick)
+        inner = radius + (2 if tick % 30 else 0)
+        draw.line((center + inner * math.sin(rad), center - inner * math.cos(rad),
+                   center + (radius + 8) * math.sin(rad), center - (radius + 8) * math.cos(rad)),
+                  fill=(0, 0, 0, 255))
+    # The arrow points downwind, from the direction the wind comes from
+    rad = math.radians(wind_dir)
+    tip = (center - radius * 0.8 * math.sin(rad), center + radius * 0.8 * math.cos(rad))
+    tail = [(center + radius * 0.8 * math.sin(rad + d), center - radius * 0.8 * math.cos(rad + d))
+            for d in (-0.5, 0.5)]
+    draw.polygon([tip, *tail], outline=(0, 0, 0, 255), fill=(255, 255, 255, 255))
+    font = ImageFont.truetype(GAUGE_FONT_PATH, 32)
+    draw.text((center, center - 14), wind_speed, font=font, fill=(0, 0, 0, 255), anchor="mm")
+    draw.text((center, center + 16), wind_dir_txt, font=font, fill=(0, 0, 0, 255), anchor="mm")
+
+    buf = BytesIO()
+    img.save(buf, "png")
+    return buf.getvalue()
+
+
+class WeatherflowSimulator:
+    '''
+    A local stand-in for the Weatherflow API and the ikitesurf login (everything
+    `WeatherflowApi` talks to) on a single host, with injectable latency, errors and
+    token expiry. Point a client at it with `api_url`/`login_url`/`anonymous_url` (or the
+    `WF_API_URL`/`WF_LOGIN_URL`/`WF_ANONYMOUS_URL` env vars) set to `url`.
+
+    Serves each request on its own thread, so injected latency overlaps like it would
+    for a real server.
+    '''
+
+    def __init__(self, config: Optional[SimulatorConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or SimulatorConfig()
+        self.rand = Random(self.config.seed)
+        self.lock = threading.Lock()
+        # wf_token -> (issued at, whether it's from a login)
+        self.tokens: Dict[str, Tuple[float, bool]] = {}
+        self.stats: Counter = Counter()
+        # Encoded payloads of the current `OB_INTERVAL_SECS` bucket only
+        self._payloads: Dict[tuple, bytes] = {}
+        self._payloads_bucket = 0
+        self.server = ThreadingHTTPServer((host, port), make_request_handler(self))
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "WeatherflowSimulator":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "WeatherflowSimulator":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, stat: str):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def delay(self, latency_ms: float):
+        time.sleep((latency_ms + self.rand.uniform(0, self.config.jitter_ms)) / 1000)
+
+    def issue_token(self, upgraded: bool) -> str:
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.tokens[token] = (time.time(), upgraded)
+        self.count("logins" if upgraded else "anonymous_sessions")
+        return token
+
+    def check_token(self, token: str) -> Optional[bool]:
+        '''
+        Whether the token is upgraded, or None if it's unknown or expired
+        '''
+        with self.lock:
+            issued = self.tokens.get(token)
+        if not issued:
+            return None
+        issued_at, upgraded = issued
+        if self.config.token_ttl_secs is not None and time.time() - issued_at > self.config.token_ttl_secs:
+            return None
+        return upgraded
+
+    def _get_payload(self, endpoint: str, spot_id: int, model_id: int, units_wind: str,
+                     upgraded: bool, null_ob_min_from_now: Optional[int], bucket: int) -> bytes:
+        # Payloads only change every `OB_INTERVAL_SECS`, so encode them once per interval,
+        # dropping the last interval's as soon as the next one starts
+        key = (endpoint, spot_id, model_id, units_wind, upgraded, null_ob_min_from_now)
+        with self.lock:
+            if bucket > self._payloads_bucket:
+                self._payloads.clear()
+                self._payloads_bucket = bucket
+            payload = self._payloads.get(key) if bucket == self._payloads_bucket else None
+        if payload is not None:
+            return payload
+
+        now = bucket * OB_INTERVAL_SECS
+        if endpoint == "getGraph":
+            payload = json.dumps(make_graph(spot_id, units_wind, upgraded, now, null_ob_min_from_now)).encode()
+        else:
+            payload = json.dumps(make_model(spot_id, model_id, units_wind, upgraded, now)).encode()
+        with self.lock:
+            if bucket == self._payloads_bucket:
+                self._payloads[key] = payload
+        return payload
+
+    def get_payload(self, endpoint: str, params: Dict[str, str]) -> bytes:
+        upgraded = self.check_token(params.get("wf_token", ""))
+        if upgraded is None:
+            self.count("rejected_tokens")
+            return json.dumps({"status": INVALID_TOKEN_STATUS}).encode()
+        if self.rand.random() < self.config.api_error_rate:
+            self.count("injected_api_errors")
+            return json.dumps({"status": INVALID_TOKEN_STATUS}).encode()
+        return self._get_payload(
+            endpoint, int(params["spot_id"]), int(params.get("model_id", -101)),
+            params.get("units_wind", "kts"), upgraded,
+            int(params["null_ob_min_from_now"]) if params.get("null_ob_min_from_now") else None,
+            int(time.time() // OB_INTERVAL_SECS))
+
+
+def make_request_handler(sim: WeatherflowSimulator):
+
+    class RequestHandler(BaseHTTPRequestHandler):
+
+        def log_message(self, format, *args):
+            logging.debug(f"Simulator: {format % args}")
+
+        def send_body(self, body: bytes, content_type: str, status: int = 200, headers: Optional[dict] = None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_page_with_token(self, upgraded: bool, status: int = 200):
+            sim.delay(sim.config.login_latency_ms)
+            token = sim.issue_token(upgraded)
+            self.send_body(b"<html></html>", "text/html", status=status, headers={
+                "Set-Cookie": f"wfToken={token}; Path=/",
+                **({"Location": "/"} if status == 302 else {}),
+            })
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            endpoint = url.path.rsplit("/", 1)[-1]
+            sim.count(endpoint or "home")
+
+            if url.path == "/":
+                # The ikitesurf pages hand out an anonymous wf_token
+                return self.send_page_with_token(upgraded=False)
+
+            if endpoint not in ("getGraph", "getModelDataBySpot", "getGauge"):
+                return self.send_body(b"Not found", "text/plain", status=404)
+
+            sim.delay(sim.config.latency_ms)
+            if sim.rand.random() < sim.config.error_rate:
+                sim.count("injected_http_errors")
+                return self.send_body(b"Service unavailable", "text/plain", status=503)
+
+            if endpoint == "getGauge":
+                return self.send_body(make_gauge_png(
+                    params.get("wind_speed", "0"), int(params.get("wind_dir", 0)),
+                    params.get("wind_dir_txt", "")), "image/png")
+
+            self.send_body(sim.get_payload(endpoint, params), "application/json")
+
+        def do_POST(self):
+            sim.count("login")
+            length = int(self.headers.get("Content-Length", 0))
+            form = {k: v[-1] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+            if not (form.get("isun") and form.get("ispw")):
+                # Like a failed login, which just shows the login page again
+                return self.send_body(b"<html></html>", "text/html")
+            self.send_page_with_token(upgraded=True, status=302)
+
+    return RequestHandler
@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import asdict, dataclass, field
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from weather_reporter.painter import get_painter_config, parse_iso_datetime
+
+WINDOW_INDEX_PATH = os.environ.get("KITE_WINDOW_INDEX_PATH")
+
+INDEX_VERSION = 1
+
+# Forecast step assumed for a window that runs to the end of the data
+DEFAULT_STEP_SECS = 60 * 60
+
+
+@dataclass
+class KiteWindow:
+    '''
+    A contiguous run of forecast hours at or above the spot's threshold speed.
+    Times are epoch seconds; `end` is the end of the last forecast hour in the window.
+    '''
+    spot_id: int
+    model: str
+    spot_name: str
+    units_wind: str
+    start: float
+    end: float
+    peak: float
+    peak_at: float
+
+
+@dataclass
+class ForecastSeries:
+    '''
+    One spot's forecast from one model, and its windows (sorted by start)
+    '''
+    spot_id: int
+    model: str
+    spot_name: str
+    units_wind: str
+    threshold: float
+    times: List[float] = field(default_factory=list)
+    speeds: List[float] = field(default_factory=list)
+    windows: List[KiteWindow] = field(default_factory=list)
+
+    def update(self, times: Sequence[float], speeds: Sequence[float]) -> List[Tuple[float, float]]:
+        '''
+        Replace the forecast, recomputing windows only around the forecast hours which changed.
+        Returns the changed spans of forecast hours, as (first, last) times.
+        '''
+        old = dict(zip(self.times, self.speeds))
+        new = dict(zip(times, speeds))
+        self.times, self.speeds = list(times), list(speeds)
+
+        # Group the changed hours into spans of consecutive hours, old or new
+        timeline = sorted(old.keys() | new.keys())
+        spans: List[Tuple[float, float]] = []
+        prev_changed = False
+        for t in timeline:
+            changed = old.get(t) != new.get(t)
+            if changed and prev_changed:
+                spans[-1] = (spans[-1][0], t)
+            elif changed:
+                spans.append((t, t))
+            prev_changed = changed
+
+        for first, last in spans:
+            self._recompute(first, last)
+        return spans
+
+    @property
+    def forecast_end(self) -> float:
+        '''
+        The end of the last forecast hour, or 0 without a forecast
+        '''
+        return self._get_end(len(self.times) - 1) if self.times else 0
+
+    def _get_end(self, i: int) -> float:
+        '''
+        The end of forecast hour `i`
+        '''
+        if i + 1 < len(self.times):
+            return self.times[i + 1]
+        step = self.times[i] - self.times[i - 1] if i > 0 else DEFAULT_STEP_SECS
+        return self.times[i] + step
+
+    def _recompute(self, first: float, last: float):
+        times, speeds = self.times, self.speeds
+
+        # Widen to whole runs above the threshold, which may reach past the changed hours
+        i = bisect_left(times, first)
+        j = bisect_right(times, last)
+        while i > 0 and speeds[i - 1] >= self.threshold:
+            i -= 1
+        while j < len(times) and speeds[j] >= self.threshold:
+            j += 1
+        span_start = min(first, times[i]) if i < len(times) else first
+        span_end = max(last, times[j - 1]) if j > 0 else last
+
+        windows = [w for w in self.windows if w.end <= span_start or w.start > span_end]
+
+        run_start = None
+        for k in range(i, j + 1):
+            if k < j and speeds[k] >= self.threshold:
+                if run_start is None:
+                    run_start = k
+            elif run_start is not None:
+                peak = max(range(run_start, k), key=lambda x: speeds[x])
+                windows.append(KiteWindow(
+                    spot_id=self.spot_id, model=self.model, spot_name=self.spot_name,
+                    units_wind=self.units_wind, start=times[run_start], end=self._get_end(k - 1),
+                    peak=speeds[peak], peak_at=times[peak],
+                ))
+                run_start = None
+
+        self.windows = sorted(windows, key=lambda w: w.start)
+
+
+class WindowIndex:
+    '''
+    Kiteable windows--forecast hours at or above `HIGHLIGHT_THRESHOLD_SPEED_KNOTS`--of every
+    spot and model, updated incrementally as forecasts are fetched and optionally kept in a
+    JSON file between runs.
+
+    Windows are kept sorted by start, with a running max of their ends, so finding the
+    next (or current) session is a bisect rather than a scan of every forecast.
+    '''
+
+    def __init__(self, path: Optional[str] = WINDOW_INDEX_PATH,
+                 threshold_speeds: Optional[Dict[str, float]] = None):
+        self.path = path
+        self.threshold_speeds = threshold_speeds or get_painter_config().threshold_speeds
+        self.series: Dict[str, ForecastSeries] = self._load()
+        self._sorted: Dict[Optional[int], Tuple[List[KiteWindow], List[float]]] = {}
+
+    def _load(self) -> Dict[str, ForecastSeries]:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as fp:
+                saved = json.load(fp)
+        except FileNotFoundError:
+            return {}
+        except ValueError as err:
+            logging.warning(f"Ignoring unreadable window index {self.path}: {err}")
+            return {}
+        if saved.get("version") != INDEX_VERSION or saved.get("threshold_speeds") != self.threshold_speeds:
+            logging.info("Window index is out of date--rebuilding")
+            return {}
+        return {
+            key: ForecastSeries(**{**s, "windows": [KiteWindow(**w) for w in s["windows"]]})
+            for key, s in saved["series"].items()
+        }
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as fp:
+            json.dump({
+                "version": INDEX_VERSION,
+                "threshold_speeds": self.threshold_speeds,
+                "series": {key: asdict(s) for key, s in self.series.items()},
+            }, fp)
+        os.replace(tmp_path, self.path)
+
+    def update(self, spots_data: Sequence[dict], now: Optional[float] = None) -> int:
+        '''
+        Update with freshly fetched (normalized) spots data. Returns the number of changed
+        spans of forecast hours that were recomputed.
+
+        Also drops the series of models missing from a spot's latest data, and any series
+        whose forecast has ended by `now` (epoch secs, by default when the data was fetched)
+        '''
+        num_spans = 0
+        updated_keys = set()
+        fetched_ats = []
+        for spot_data in spots_data:
+            graph_summary = spot_data["graph_summary"]
+            spot_name = graph_summary["name"]
+            if graph_summary.get("current_time_epoch_utc") is not None:
+                fetched_ats.append(graph_summary["current_time_epoch_utc"] / 1000)
+            for model, model_data in spot_data["models"].items():
+                spot_id = int(model_data["spot_id"])
+                units_wind = model_data["units_wind"]
+                threshold = self.threshold_speeds[units_wind]
+                key = f"{spot_id}:{model}"
+                updated_keys.add(key)
+                series = self.series.get(key)
+                if not series or series.threshold != threshold or series.units_wind != units_wind:
+                    series = self.series[key] = ForecastSeries(
+                        spot_id=spot_id, model=model, spot_name=spot_name,
+                        units_wind=units_wind, threshold=threshold)
+
+                forecast = sorted(
+                    (parse_iso_datetime(item["model_time_utc"]).timestamp(), item["wind_speed"] or 0)
+                    for item in model_data["model_data"]
+                )
+                spans = series.update([t for t, _ in forecast], [s for _, s in forecast])
+                if spans:
+                    logging.info(f"Recomputed kiteable windows of {spot_name} ({key}) for {len(spans)} changed spans")
+                num_spans += len(spans)
+
+        if now is None:
+            now = max(fetched_ats) if fetched_ats else time.time()
+        updated_spot_ids = {self.series[key].spot_id for key in updated_keys}
+        stale_keys = [
+            key for key, series in self.series.items()
+            if (series.spot_id in updated_spot_ids and key not in updated_keys) or series.forecast_end <= now
+        ]
+        for key in stale_keys:
+            del self.series[key]
+        if stale_keys:
+            logging.info(f"Dropped stale forecast series {stale_keys}")
+
+        if num_spans or stale_keys:
+            self._sorted.clear()
+        return num_spans
+
+    def _get_sorted(self, spot_id: Optional[int]) -> Tuple[List[KiteWindow], List[float]]:
+        if spot_id not in self._sorted:
+            windows = sorted(
+                (w for s in self.series.values() if spot_id is None or s.spot_id == spot_id
+                 for w in s.windows),
+                key=lambda w: w.start)
+            self._sorted[spot_id] = (windows, list(accumulate((w.end for w in windows), max)))
+        return self._sorted[spot_id]
+
+    def windows(self, spot_id: Optional[int] = None, after: float = 0) -> List[KiteWindow]:
+        '''
+        Windows which haven't ended by `after`, by start
+        '''
+        windows, _ = self._get_sorted(spot_id)
+        return [w for w in windows if w.end > after]
+
+    def next_window(self, now: float, spot_id: Optional[int] = None) -> Optional[KiteWindow]:
+        '''
+        The current window, or else the next to start--at any spot, unless `spot_id` is given
+        '''
+        windows, max_ends = self._get_sorted(spot_id)
+        # The first window by start which hasn't ended is where the running max passes now
+        i = bisect_right(max_ends, now)
+        return windows[i] if i < len(windows) else None